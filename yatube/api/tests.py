@@ -0,0 +1,223 @@
+import base64
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from .views import PAGE_SIZE, credentials_key
+
+User = get_user_model()
+
+
+def basic_auth(username, password):
+    token = base64.b64encode(f'{username}:{password}'.encode()).decode()
+    return {'HTTP_AUTHORIZATION': f'Basic {token}'}
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='secret')
+        cls.reader = User.objects.create_user('reader', password='secret')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(PAGE_SIZE + 5)
+        )
+        cls.post = Post.objects.latest('pk')
+
+    def get_json(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_post_list_cursor_pages(self):
+        url = reverse('api:post_list')
+        with self.assertNumQueries(1):
+            first = self.get_json(url)
+        self.assertEqual(len(first['results']), PAGE_SIZE)
+        self.assertIsNone(first['previous'])
+        second = self.get_json(first['next'])
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(
+            ids, list(Post.objects.values_list('pk', flat=True))
+        )
+        self.assertEqual(first['results'][0]['author'], 'author')
+        self.assertEqual(first['results'][0]['group'], 'group')
+
+    def test_fields_selection(self):
+        data = self.get_json(reverse('api:post_list') + '?fields=id,text')
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertIn('fields=id%2Ctext', data['next'])
+        response = self.client.get(reverse('api:post_list') + '?fields=x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters(self):
+        data = self.get_json(reverse('api:post_list') + '?author=reader')
+        self.assertEqual(data['results'], [])
+        data = self.get_json(reverse('api:post_list') + '?group=group')
+        self.assertEqual(len(data['results']), PAGE_SIZE)
+
+    def test_etag_and_gzip(self):
+        url = reverse('api:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            reverse('api:post_list'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), PAGE_SIZE)
+
+    def test_create_and_edit_post(self):
+        url = reverse('api:post_list')
+        response = self.client.post(
+            url, {'text': 'Новый'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.post(
+            url, {'text': 'Новый', 'group': 'group'},
+            content_type='application/json',
+            **basic_auth('reader', 'secret')
+        )
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(created['author'], 'reader')
+        self.assertEqual(created['group'], 'group')
+
+        detail_url = reverse('api:post_detail', args=[created['id']])
+        response = self.client.patch(
+            detail_url, {'group': None}, content_type='application/json',
+            **basic_auth('reader', 'secret')
+        )
+        self.assertEqual(response.json()['group'], None)
+        self.assertEqual(response.json()['text'], 'Новый')
+
+        response = self.client.delete(
+            detail_url, **basic_auth('author', 'secret')
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.delete(
+            detail_url, **basic_auth('reader', 'secret')
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Post.objects.filter(pk=created['id']).exists())
+
+    def test_validation_errors(self):
+        response = self.client.post(
+            reverse('api:post_list'), {'text': ''},
+            content_type='application/json',
+            **basic_auth('reader', 'secret')
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json())
+        response = self.client.post(
+            reverse('api:post_list'), {'text': 'Пост', 'group': 'missing'},
+            content_type='application/json',
+            **basic_auth('reader', 'secret')
+        )
+        self.assertEqual(response.json(), {'group': ['Группа не найдена.']})
+
+    def test_session_writes_require_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.reader)
+        response = client.post(
+            reverse('api:post_list'), {'text': 'Пост'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_anonymous_write_gets_401(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(
+            reverse('api:post_list'), {'text': 'Пост'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+
+    def test_basic_auth_is_remembered(self):
+        url = reverse('api:follow_list')
+        auth = basic_auth('reader', 'secret')
+        self.assertEqual(self.client.get(url, **auth).status_code, 200)
+        self.assertIsNotNone(cache.get(credentials_key('reader:secret')))
+        self.assertEqual(self.client.get(url, **auth).status_code, 200)
+        # Со сменой пароля запомненная проверка больше не действует
+        reader = User.objects.get(pk=self.reader.pk)
+        reader.set_password('changed')
+        reader.save()
+        self.assertEqual(self.client.get(url, **auth).status_code, 401)
+        response = self.client.get(url, **basic_auth('reader', 'changed'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_comments(self):
+        url = reverse('api:comment_list', args=[self.post.pk])
+        response = self.client.post(
+            url, {'text': 'Комментарий'}, content_type='application/json',
+            **basic_auth('reader', 'secret')
+        )
+        self.assertEqual(response.status_code, 201)
+        data = self.get_json(url)
+        self.assertEqual(
+            data['results'],
+            [{
+                'id': Comment.objects.get().pk,
+                'post': self.post.pk,
+                'author': 'reader',
+                'text': 'Комментарий',
+                'pub_date': response.json()['pub_date'],
+            }]
+        )
+
+    def test_groups(self):
+        # bulk_create обходит счётчики, save() - нет
+        Post.objects.create(text='Пост', author=self.author, group=self.group)
+        data = self.get_json(reverse('api:group_list'))
+        self.assertEqual(data['results'][0]['slug'], 'group')
+        self.assertEqual(data['results'][0]['post_count'], 1)
+        data = self.get_json(reverse('api:group_detail', args=['group']))
+        self.assertEqual(data['title'], 'Группа')
+        response = self.client.get(reverse('api:group_detail', args=['x']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow(self):
+        auth = basic_auth('reader', 'secret')
+        url = reverse('api:follow_list')
+        response = self.client.post(
+            url, {'author': 'author'}, content_type='application/json', **auth
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+        )
+        response = self.client.post(
+            url, {'author': 'reader'}, content_type='application/json', **auth
+        )
+        self.assertEqual(response.status_code, 400)
+        data = self.get_json(url, **auth)
+        self.assertEqual([f['author'] for f in data['results']], ['author'])
+
+        response = self.client.delete(
+            reverse('api:follow_detail', args=['author']), **auth
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.exists())
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 401)
+
+    def test_method_not_allowed(self):
+        response = self.client.put(reverse('api:group_list'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, HEAD')
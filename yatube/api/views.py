@@ -0,0 +1,378 @@
+import base64
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.middleware.http import ConditionalGetMiddleware
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import salted_hmac
+from django.utils.decorators import decorator_from_middleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+
+from core.paginator import CursorPaginator
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+PAGE_SIZE = 20
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Поля ответа: имя в API -> путь для .values()
+POST_FIELDS = {
+    'id': 'pk',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comment_count': 'comment_count',
+}
+GROUP_FIELDS = {
+    'id': 'pk',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'post_count': 'post_count',
+}
+COMMENT_FIELDS = {
+    'id': 'pk',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'pub_date': 'pub_date',
+}
+FOLLOW_FIELDS = {
+    'id': 'pk',
+    'author': 'author__username',
+}
+CONVERTERS = {
+    'image': lambda name: default_storage.url(name) if name else None,
+}
+
+# ETag по телу ответа и 304 на совпавший If-None-Match
+conditional_get = decorator_from_middleware(ConditionalGetMiddleware)
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class CSRFCheck(CsrfViewMiddleware):
+    def _reject(self, request, reason):
+        return reason
+
+
+def error_response(status, detail):
+    if isinstance(detail, str):
+        detail = {'detail': detail}
+    response = JsonResponse(detail, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = 'Basic realm="api"'
+    return response
+
+
+def basic_auth_user(request):
+    """Пользователь из заголовка Authorization: Basic или None."""
+    scheme, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', ''
+    ).partition(' ')
+    if scheme.lower() != 'basic':
+        return None
+    try:
+        decoded = base64.b64decode(credentials).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError(401, 'Неверный заголовок Authorization.')
+    username, _, password = decoded.partition(':')
+    key = credentials_key(decoded)
+    cached = cache.get(key)
+    if cached is not None:
+        pk, password_hash = cached
+        user = User.objects.filter(pk=pk, is_active=True).first()
+        # Смена пароля делает запомненную проверку недействительной
+        if user is not None and user.password == password_hash:
+            return user
+    user = authenticate(request, username=username, password=password)
+    if user is None:
+        raise ApiError(401, 'Неверные имя пользователя или пароль.')
+    if settings.API_AUTH_CACHE_SECONDS:
+        cache.set(
+            key, (user.pk, user.password), settings.API_AUTH_CACHE_SECONDS
+        )
+    return user
+
+
+def credentials_key(credentials):
+    """Ключ кэша проверенной пары логин:пароль; сам пароль в нём не виден."""
+    digest = salted_hmac('api.basic_auth', credentials).hexdigest()
+    return f'api:basic:{digest}'
+
+
+def authenticate_request(request):
+    """
+    Пишущие запросы с сессией проверяют CSRF, как HTML-формы;
+    с Basic-авторизацией cookie не участвуют, и проверка не нужна.
+    Анонимная запись получает 401 с WWW-Authenticate, а не ошибку CSRF.
+    """
+    user = basic_auth_user(request)
+    if user is not None:
+        request.user = user
+    elif request.method not in SAFE_METHODS:
+        require_user(request)
+        reason = CSRFCheck().process_view(request, None, (), {})
+        if reason:
+            raise ApiError(403, f'CSRF: {reason}')
+
+
+def api_view(*methods):
+    """
+    Обёртка JSON-эндпоинта: методы, авторизация, ошибки, ETag и gzip.
+    """
+    if 'GET' in methods:
+        methods += ('HEAD',)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    response = error_response(405, 'Метод не разрешён.')
+                    response['Allow'] = ', '.join(methods)
+                    return response
+                authenticate_request(request)
+                response = view(request, *args, **kwargs)
+            except ApiError as error:
+                response = error_response(error.status, error.detail)
+            except Http404:
+                response = error_response(404, 'Не найдено.')
+            patch_vary_headers(response, ('Authorization',))
+            return response
+        return csrf_exempt(gzip_page(conditional_get(wrapper)))
+    return decorator
+
+
+def require_user(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужна авторизация.')
+
+
+def json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Тело запроса - не JSON.')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Ожидается JSON-объект.')
+    return data
+
+
+def form_errors(form):
+    return {
+        field: [error['message'] for error in errors]
+        for field, errors in form.errors.get_json_data().items()
+    }
+
+
+def selected_fields(request, fields):
+    """Поля из ?fields=a,b или все поля ресурса."""
+    names = request.GET.get('fields')
+    if not names:
+        return fields
+    names = names.split(',')
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(400, f'Неизвестные поля: {", ".join(unknown)}.')
+    return {name: fields[name] for name in names}
+
+
+def serialize(rows, fields):
+    """Словари из .values() в ответ API, без создания моделей."""
+    return [
+        {
+            name: CONVERTERS.get(name, lambda value: value)(row[path])
+            for name, path in fields.items()
+        }
+        for row in rows
+    ]
+
+
+def values(queryset, fields, *extra):
+    return queryset.values(*dict.fromkeys([*extra, *fields.values()]))
+
+
+def page_link(request, **params):
+    """Ссылка на соседнюю страницу с теми же фильтрами и полями."""
+    query = request.GET.copy()
+    for name, value in params.items():
+        if value is None:
+            return None
+        query[name] = value
+    return request.build_absolute_uri('?' + query.urlencode())
+
+
+def cursor_list(request, queryset, fields):
+    """Список по курсору (pub_date, id): без COUNT(*) и OFFSET."""
+    fields = selected_fields(request, fields)
+    page = CursorPaginator(
+        values(queryset, fields, 'pk', 'pub_date'), PAGE_SIZE
+    ).get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': serialize(page, fields),
+        'next': page_link(request, cursor=page.next_cursor),
+        'previous': page_link(request, cursor=page.previous_cursor),
+    })
+
+
+def page_list(request, queryset, fields):
+    """Короткие списки без даты публикации листаются по ?page=."""
+    fields = selected_fields(request, fields)
+    page = Paginator(
+        values(queryset, fields, 'pk'), PAGE_SIZE
+    ).get_page(request.GET.get('page'))
+    return JsonResponse({
+        'results': serialize(page, fields),
+        'next': page_link(
+            request,
+            page=page.next_page_number() if page.has_next() else None
+        ),
+        'previous': page_link(
+            request,
+            page=(
+                page.previous_page_number() if page.has_previous() else None
+            )
+        ),
+    })
+
+
+def detail(request, queryset, fields, status=200):
+    fields = selected_fields(request, fields)
+    row = values(queryset, fields).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(serialize([row], fields)[0], status=status)
+
+
+def post_form_data(data, post=None):
+    """Данные для PostForm: группа в API задаётся slug'ом."""
+    form_data = {
+        'text': data.get('text', post.text if post else ''),
+        'group': post.group_id if post else None,
+    }
+    if data.get('group') is not None:
+        form_data['group'] = Group.objects.filter(
+            slug=data['group']
+        ).values_list('pk', flat=True).first()
+        if form_data['group'] is None:
+            raise ApiError(400, {'group': ['Группа не найдена.']})
+    elif 'group' in data:
+        form_data['group'] = None
+    return form_data
+
+
+@api_view('GET', 'POST')
+def post_list(request):
+    if request.method == 'POST':
+        require_user(request)
+        form = PostForm(post_form_data(json_body(request)))
+        if not form.is_valid():
+            raise ApiError(400, form_errors(form))
+        post = form.save(commit=False)
+        post.author = request.user
+        post.save()
+        return detail(request, Post.objects.filter(pk=post.pk), POST_FIELDS,
+                      status=201)
+    posts = Post.objects.all()
+    if 'group' in request.GET:
+        posts = posts.filter(group__slug=request.GET['group'])
+    if 'author' in request.GET:
+        posts = posts.filter(author__username=request.GET['author'])
+    return cursor_list(request, posts, POST_FIELDS)
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+def post_detail(request, post_id):
+    posts = Post.objects.filter(pk=post_id)
+    if request.method == 'GET':
+        return detail(request, posts, POST_FIELDS)
+    require_user(request)
+    post = get_object_or_404(posts)
+    if post.author_id != request.user.pk:
+        raise ApiError(403, 'Изменять пост может только автор.')
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    form = PostForm(post_form_data(json_body(request), post), instance=post)
+    if not form.is_valid():
+        raise ApiError(400, form_errors(form))
+    form.save()
+    return detail(request, posts, POST_FIELDS)
+
+
+@api_view('GET', 'POST')
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if request.method == 'POST':
+        require_user(request)
+        form = CommentForm(json_body(request))
+        if not form.is_valid():
+            raise ApiError(400, form_errors(form))
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        comment.save()
+        return detail(request, Comment.objects.filter(pk=comment.pk),
+                      COMMENT_FIELDS, status=201)
+    return cursor_list(request, post.comments.all(), COMMENT_FIELDS)
+
+
+@api_view('GET')
+def group_list(request):
+    return page_list(request, Group.objects.order_by('pk'), GROUP_FIELDS)
+
+
+@api_view('GET')
+def group_detail(request, slug):
+    return detail(request, Group.objects.filter(slug=slug), GROUP_FIELDS)
+
+
+@api_view('GET', 'POST')
+def follow_list(request):
+    require_user(request)
+    if request.method == 'POST':
+        username = json_body(request).get('author')
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise ApiError(400, {'author': ['Автор не найден.']})
+        if author == request.user:
+            raise ApiError(400, {'author': ['Нельзя подписаться на себя.']})
+        follow, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+        return detail(request, Follow.objects.filter(pk=follow.pk),
+                      FOLLOW_FIELDS, status=201 if created else 200)
+    follows = Follow.objects.filter(user=request.user).order_by('pk')
+    return page_list(request, follows, FOLLOW_FIELDS)
+
+
+@api_view('DELETE')
+def follow_detail(request, username):
+    require_user(request)
+    follows = Follow.objects.filter(
+        user=request.user, author__username=username
+    )
+    if not follows.exists():
+        raise Http404
+    follows.delete()
+    return HttpResponse(status=204)
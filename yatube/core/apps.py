@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite)
+        # Модули tasks приложений регистрируют задачи очереди
+        autodiscover_modules('tasks')
+        if settings.METRICS_ENABLED:
+            from .metrics import instrument_templates
+            instrument_templates()
@@ -0,0 +1,67 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .metrics import current_sample
+
+_executor = None
+_workers = 0
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _workers
+    with _lock:
+        if _workers != settings.DB_EXECUTOR_WORKERS:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _workers = settings.DB_EXECUTOR_WORKERS
+            _executor = ThreadPoolExecutor(
+                max_workers=_workers, thread_name_prefix='db'
+            )
+    return _executor
+
+
+def _run(call):
+    # Замеры ответа (MetricsMiddleware) пришли с контекстом; соединения
+    # потока пула оборачиваются ими так же, как соединения ответа
+    sample = current_sample.get()
+    try:
+        with ExitStack() as stack:
+            if sample is not None:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+            return call()
+    finally:
+        # Поток пула держит своё соединение; CONN_MAX_AGE решает, надолго ли
+        close_old_connections()
+
+
+def gather(*calls):
+    """
+    Выполняет независимые чтения из БД одновременно и возвращает
+    их результаты по порядку. Первое - в текущем потоке, остальные -
+    в пуле из DB_EXECUTOR_WORKERS потоков со своими соединениями;
+    контекст (выбранная реплика) переносится в поток пула.
+
+    При DB_EXECUTOR_WORKERS = 0 всё выполняется по очереди здесь же:
+    так запросы видны assertNumQueries и транзакции тестов.
+    Исключение первой упавшей функции пробрасывается дальше.
+    """
+    if not settings.DB_EXECUTOR_WORKERS or len(calls) < 2:
+        return [call() for call in calls]
+    executor = _get_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, _run, call)
+        for call in calls[1:]
+    ]
+    try:
+        first = calls[0]()
+    finally:
+        # Ответ не уходит, пока в пуле идут его запросы
+        wait(futures)
+    return [first, *(future.result() for future in futures)]
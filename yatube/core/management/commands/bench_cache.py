@@ -0,0 +1,94 @@
+import json
+import os
+import random
+import tempfile
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+PAYLOAD = 'x' * 2048
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def run_worker(args):
+    """Cache-aside нагрузка одного процесса: get, при промахе set."""
+    backend, location, keys, ops, seed = args
+    cache = import_string(BACKENDS[backend])(
+        location, {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': keys * 2}}
+    )
+    rnd = random.Random(seed)
+    # Популярность ключей по закону Ципфа, как у страниц лент
+    weights = [1 / rank for rank in range(1, keys + 1)]
+    hits = 0
+    latencies = []
+    for key in rnd.choices(range(keys), weights, k=ops):
+        started = time.perf_counter()
+        if cache.get(f'page:{key}') is None:
+            cache.set(f'page:{key}', PAYLOAD)
+        else:
+            hits += 1
+        latencies.append(time.perf_counter() - started)
+    return hits, latencies
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает долю попаданий и задержку кэшей LocMemCache '
+        'и SQLiteCache при нагрузке из нескольких процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=5000,
+                            help='Операций на процесс')
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести отчёт в JSON')
+
+    def handle(self, *args, **options):
+        report = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for backend in BACKENDS:
+                location = os.path.join(directory, f'{backend}.sqlite3')
+                report[backend] = self.measure(backend, location, options)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for backend, result in report.items():
+            self.stdout.write(
+                f'{backend:>7}: hit rate {result["hit_rate"]:.1%}, '
+                f'p50 {result["p50_us"]:.0f} us, '
+                f'p99 {result["p99_us"]:.0f} us, '
+                f'{result["ops_per_sec"]:.0f} ops/s'
+            )
+
+    def measure(self, backend, location, options):
+        processes = options['processes']
+        jobs = [
+            (backend, location, options['keys'], options['ops'], seed)
+            for seed in range(processes)
+        ]
+        started = time.perf_counter()
+        with Pool(processes) as pool:
+            results = pool.map(run_worker, jobs)
+        elapsed = time.perf_counter() - started
+        hits = sum(worker_hits for worker_hits, _ in results)
+        latencies = sorted(
+            latency for _, worker in results for latency in worker
+        )
+        return {
+            'processes': processes,
+            'hit_rate': hits / len(latencies),
+            'p50_us': percentile(latencies, 0.5) * 1e6,
+            'p99_us': percentile(latencies, 0.99) * 1e6,
+            'ops_per_sec': len(latencies) / elapsed,
+        }
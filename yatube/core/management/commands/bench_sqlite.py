@@ -0,0 +1,155 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Чтение страницы ленты: 10 последних постов с авторами и их число
+FEED_SQL = (
+    'SELECT p.id, p.text, p.pub_date, u.username FROM post p '
+    'JOIN author u ON u.id = p.author_id '
+    'ORDER BY p.pub_date DESC, p.id DESC LIMIT 10 OFFSET ?'
+)
+COUNT_SQL = 'SELECT COUNT(*) FROM post'
+INSERT_SQL = 'INSERT INTO post (text, pub_date, author_id) VALUES (?, ?, ?)'
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def create_database(path, posts, authors):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        'CREATE TABLE author (id INTEGER PRIMARY KEY, username TEXT);'
+        'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, '
+        'pub_date REAL, author_id INTEGER REFERENCES author (id));'
+        'CREATE INDEX post_pub_date ON post (pub_date, id);'
+    )
+    connection.executemany(
+        'INSERT INTO author (id, username) VALUES (?, ?)',
+        ((i, f'user{i}') for i in range(1, authors + 1))
+    )
+    now = time.time()
+    connection.executemany(
+        INSERT_SQL,
+        ((f'Пост {i} ' * 20, now - i, i % authors + 1)
+         for i in range(posts))
+    )
+    connection.commit()
+    connection.close()
+
+
+def connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=settings.SQLITE_BUSY_TIMEOUT)
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+    return connection
+
+
+def run_worker(args):
+    """
+    Поток запросов одного процесса: ленты и изредка новые посты.
+    persistent=False открывает файл на каждый запрос, как Django
+    без CONN_MAX_AGE.
+    """
+    path, pragmas, persistent, ops, write_share, authors, seed = args
+    rnd = random.Random(seed)
+    connection = connect(path, pragmas) if persistent else None
+    reads, writes, errors = [], [], 0
+    for _ in range(ops):
+        write = rnd.random() < write_share
+        started = time.perf_counter()
+        db = connection or connect(path, pragmas)
+        try:
+            if write:
+                with db:
+                    db.execute(INSERT_SQL, (
+                        'Новый пост', time.time(), rnd.randint(1, authors)
+                    ))
+            else:
+                db.execute(FEED_SQL, (rnd.randrange(0, 100) * 10,)).fetchall()
+                db.execute(COUNT_SQL).fetchone()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        finally:
+            if connection is None:
+                db.close()
+        (writes if write else reads).append(time.perf_counter() - started)
+    return reads, writes, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при смешанной нагрузке '
+        'из нескольких процессов: настройки по умолчанию против '
+        'SQLITE_PRAGMAS с постоянными соединениями'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=2000,
+                            help='Запросов на процесс')
+        parser.add_argument('--write-share', type=float, default=0.1,
+                            help='Доля пишущих запросов')
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести отчёт в JSON')
+
+    def handle(self, *args, **options):
+        modes = {
+            'default': ({}, False),
+            'tuned': (settings.SQLITE_PRAGMAS, True),
+        }
+        report = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, (pragmas, persistent) in modes.items():
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                create_database(path, options['posts'], options['authors'])
+                report[mode] = self.measure(
+                    path, pragmas, persistent, options
+                )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for mode, result in report.items():
+            self.stdout.write(
+                f'{mode:>7}: {result["ops_per_sec"]:.0f} запросов/с, '
+                f'чтение p50 {result["read_p50_ms"]:.2f} мс '
+                f'p99 {result["read_p99_ms"]:.2f} мс, '
+                f'запись p50 {result["write_p50_ms"]:.2f} мс '
+                f'p99 {result["write_p99_ms"]:.2f} мс, '
+                f'ошибок {result["errors"]}'
+            )
+
+    def measure(self, path, pragmas, persistent, options):
+        processes = options['processes']
+        jobs = [
+            (path, pragmas, persistent, options['ops'],
+             options['write_share'], options['authors'], seed)
+            for seed in range(processes)
+        ]
+        started = time.perf_counter()
+        with Pool(processes) as pool:
+            results = pool.map(run_worker, jobs)
+        elapsed = time.perf_counter() - started
+        reads = sorted(value for worker, _, _ in results for value in worker)
+        writes = sorted(value for _, worker, _ in results for value in worker)
+        result = {
+            'processes': processes,
+            'ops_per_sec': (len(reads) + len(writes)) / elapsed,
+            'errors': sum(errors for _, _, errors in results),
+        }
+        for name, values in (('read', reads), ('write', writes)):
+            for label, share in (('p50', 0.5), ('p99', 0.99)):
+                result[f'{name}_{label}_ms'] = (
+                    percentile(values, share) * 1000 if values else 0
+                )
+        return result
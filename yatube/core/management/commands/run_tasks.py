@@ -0,0 +1,85 @@
+import os
+import signal
+import time
+from multiprocessing import Process
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.metrics import registry
+from core.tasks import work
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди задач core.tasks: выполняет готовые задачи '
+        'в нескольких процессах, пока его не остановят'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--lease', type=int, default=300,
+                            help='Секунд на задачу, после которых её '
+                                 'возьмёт другой воркер')
+        parser.add_argument(
+            '--metrics-dir',
+            help='Каталог для гистограмм задач в формате Prometheus '
+                 '(textfile collector), файл на процесс'
+        )
+
+    def handle(self, *args, **options):
+        if options['once'] or options['processes'] < 2:
+            done = self.loop(options)
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
+            return
+        # Соединения родителя не должны достаться детям после fork
+        connections.close_all()
+        workers = [
+            Process(target=self.loop, args=(options,))
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        def stop(*args):
+            # Воркеры доделывают текущую пачку и выходят, родитель
+            # дожидается их ниже
+            for worker in workers:
+                worker.terminate()
+
+        # Обработчик ставится после start(), чтобы дети его не унаследовали
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+
+    def loop(self, options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        done = 0
+        while not stopping:
+            finished = work(lease=options['lease'], limit=100)
+            done += finished
+            if options['metrics_dir'] and finished:
+                self.write_metrics(options['metrics_dir'])
+            if options['once'] and not finished:
+                break
+            if not finished:
+                time.sleep(options['poll'])
+        connections.close_all()
+        return done
+
+    def write_metrics(self, directory):
+        path = os.path.join(directory, f'yatube_tasks_{os.getpid()}.prom')
+        # Запись через переименование: сборщик не увидит полфайла
+        with open(path + '.tmp', 'w') as output:
+            output.write(registry.render(worker=os.getpid()))
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует базу default в локальные реплики SQLite из '
+        'DATABASE_REPLICAS через online backup: заменяет репликацию '
+        'при разработке'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS пуст: реплик нет.')
+        source = settings.DATABASES['default']
+        if source['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Копировать умеем только SQLite.')
+        with sqlite3.connect(source['NAME']) as primary:
+            for alias in settings.DATABASE_REPLICAS:
+                # Открытое соединение Django держало бы старый снимок
+                connections[alias].close()
+                replica = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    primary.backup(replica)
+                finally:
+                    replica.close()
+                self.stdout.write(f'{alias}: скопировано')
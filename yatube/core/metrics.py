@@ -0,0 +1,179 @@
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+# Секунды: от быстрых ответов из кэша до явно медленных страниц
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# Очередь задач: от мгновенного запуска до часов ожидания
+TASK_BUCKETS = (
+    0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0, 3600.0
+)
+
+# Имя метрики Prometheus -> (описание, границы корзин, имя метки)
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'Полное время ответа', TIME_BUCKETS, 'view'
+    ),
+    'yatube_db_duration_seconds': (
+        'Время в запросах к БД за ответ', TIME_BUCKETS, 'view'
+    ),
+    'yatube_template_duration_seconds': (
+        'Время рендера шаблонов за ответ (с запросами из шаблонов)',
+        TIME_BUCKETS, 'view'
+    ),
+    'yatube_db_queries': (
+        'Число запросов к БД за ответ', QUERY_BUCKETS, 'view'
+    ),
+    'yatube_task_wait_seconds': (
+        'Ожидание задачи в очереди до запуска', TASK_BUCKETS, 'task'
+    ),
+    'yatube_task_duration_seconds': (
+        'Время выполнения задачи', TASK_BUCKETS, 'task'
+    ),
+}
+# Сколько запросов SQL запоминать для лога медленного ответа
+SQL_SAMPLE_LIMIT = 50
+
+current_sample = ContextVar('current_sample', default=None)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последняя ячейка - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    Гистограммы метрик по имени URL или задачи; общие для потоков
+    процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, label, values):
+        with self._lock:
+            for metric, value in values.items():
+                histogram = self._histograms.get((metric, label))
+                if histogram is None:
+                    histogram = Histogram(METRICS[metric][1])
+                    self._histograms[(metric, label)] = histogram
+                histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self, **extra):
+        """
+        Текстовый формат экспозиции Prometheus; extra - общие метки
+        всех рядов, например номер процесса воркера.
+        """
+        common = ''.join(
+            f',{name}="{escape_label(str(value))}"'
+            for name, value in extra.items()
+        )
+        lines = []
+        with self._lock:
+            for metric, (description, buckets, name) in METRICS.items():
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} histogram')
+                for (key, value), histogram in sorted(
+                    self._histograms.items()
+                ):
+                    if key != metric:
+                        continue
+                    label = f'{name}="{escape_label(value)}"{common}'
+                    cumulative = 0
+                    bounds = [*map(str, buckets), '+Inf']
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f'{metric}_bucket{{{label},le="{bound}"}}'
+                            f' {cumulative}'
+                        )
+                    lines.append(f'{metric}_sum{{{label}}} {histogram.sum}')
+                    lines.append(
+                        f'{metric}_count{{{label}}} {histogram.count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestSample:
+    """
+    Замеры одного ответа. Экземпляр - ещё и execute_wrapper
+    для соединений с БД: считает запросы и их время, в том числе
+    из потоков core.executor.gather.
+    """
+
+    def __init__(self, keep_sql):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.keep_sql = keep_sql
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.db_time += elapsed
+                if self.keep_sql and len(self.sql) < SQL_SAMPLE_LIMIT:
+                    self.sql.append((elapsed, sql))
+
+
+def instrument_templates():
+    """
+    Оборачивает рендер шаблонов Django, чтобы MetricsMiddleware
+    знала его время. Вне замеряемого ответа обёртка ничего не делает.
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'instrumented', False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, context=None, request=None):
+        sample = current_sample.get()
+        if sample is None or sample.rendering:
+            return original(self, context, request)
+        sample.rendering = True
+        started = perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            sample.template_time += perf_counter() - started
+            sample.rendering = False
+
+    render.instrumented = True
+    Template.render = render
@@ -0,0 +1,105 @@
+import logging
+import random
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import current_sample, registry, RequestSample
+from .routers import current_routing, RequestRouting
+
+PIN_COOKIE = 'read_primary'
+
+logger = logging.getLogger('core.metrics')
+
+
+class MetricsMiddleware:
+    """
+    Пишет в гистограммы время ответа, время и число запросов к БД
+    и время рендера шаблонов по имени URL. Медленные ответы
+    (дольше SLOW_REQUEST_SECONDS) попадают в лог вместе с SQL.
+
+    При METRICS_ENABLED = False не подключается вовсе.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow = settings.SLOW_REQUEST_SECONDS
+        sample = RequestSample(keep_sql=slow is not None)
+        token = current_sample.set(sample)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        elapsed = perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        registry.observe(view, {
+            'yatube_request_duration_seconds': elapsed,
+            'yatube_db_duration_seconds': sample.db_time,
+            'yatube_template_duration_seconds': sample.template_time,
+            'yatube_db_queries': sample.queries,
+        })
+        if slow is not None and elapsed >= slow:
+            self.log_slow(request, view, elapsed, sample)
+        return response
+
+    def log_slow(self, request, view, elapsed, sample):
+        statements = '\n'.join(
+            f'  {duration * 1000:.1f} мс: {sql}'
+            for duration, sql in sorted(sample.sql, reverse=True)
+        )
+        logger.warning(
+            'Медленный ответ %s %s (%s): %.3f с, БД %.3f с '
+            '(%d запросов), шаблоны %.3f с\n%s',
+            request.method, request.path, view, elapsed, sample.db_time,
+            sample.queries, sample.template_time, statements
+        )
+
+
+class ReplicaMiddleware:
+    """
+    Отправляет чтения GET-представлений из REPLICA_VIEWS на одну из
+    DATABASE_REPLICAS. Ответ, который что-то записал в БД, ставит
+    cookie, и ещё REPLICA_PIN_SECONDS этот браузер читает с default:
+    автор сразу видит свой пост, даже если реплика отстаёт.
+
+    Без реплик не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = RequestRouting()
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name in settings.REPLICA_VIEWS
+                and PIN_COOKIE not in request.COOKIES):
+            current_routing.get().replica = random.choice(
+                settings.DATABASE_REPLICAS
+            )
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class PubdateModel(models.Model):
@@ -13,3 +14,32 @@ class PubdateModel(models.Model):
         # Это абстрактная модель:
         abstract = True
         ordering = ['-pub_date']
+
+
+class Task(models.Model):
+    """
+    Отложенный вызов задачи из core.tasks. Строка живёт, пока задача
+    ждёт или выполняется, и удаляется после успеха; упавшая после
+    всех попыток остаётся с failed = True и текстом ошибки.
+    """
+    name = models.CharField(max_length=200)
+    # Аргументы вызова списком JSON
+    args = models.TextField()
+    # Одинаковые ожидающие задачи склеиваются по ключу; взятая
+    # в работу задача ключ теряет, чтобы новый вызов не потерялся
+    key = models.CharField(max_length=40, unique=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Пока не истекло, задача занята воркером
+    locked_until = models.DateTimeField(null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    failed = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['failed', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name}{self.args}'
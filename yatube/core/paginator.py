@@ -0,0 +1,206 @@
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, obj, field='pub_date'):
+    """
+    Кодирует позицию (дата, id) в непрозрачный токен для ?cursor=.
+
+    obj - объект модели или словарь из .values() с ключами field и pk.
+    """
+    if isinstance(obj, dict):
+        value, pk = obj[field], obj['pk']
+    else:
+        value, pk = getattr(obj, field), obj.pk
+    raw = f'{direction}|{value.isoformat()}|{pk}'
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, дата, id) или None для битого токена."""
+    try:
+        raw = force_str(urlsafe_base64_decode(cursor))
+        direction, value, pk = raw.split('|')
+        position = parse_datetime(value)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or position is None:
+        return None
+    return direction, position, pk
+
+
+class CursorPage(Page):
+    """Страница keyset-пагинации: без номера и без общего COUNT(*)."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.cursor_for(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.cursor_for(PREVIOUS, self.object_list[0])
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинация по ключу (pub_date, id) вместо OFFSET.
+
+    Любая страница - один диапазонный запрос по индексу pub_date,
+    независимо от глубины. Лишняя запись в выборке показывает,
+    есть ли продолжение. descending=False листает от старых к новым.
+    """
+    cursor_mode = True
+
+    def __init__(self, object_list, per_page, field='pub_date',
+                 descending=True):
+        super().__init__(object_list, per_page)
+        self.field = field
+        self.descending = descending
+
+    def cursor_for(self, direction, obj):
+        return encode_cursor(direction, obj, self.field)
+
+    def get_page(self, cursor):
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._first_page()
+        direction, value, pk = position
+        if direction == NEXT:
+            return self._page_after(value, pk)
+        return self._page_before(value, pk)
+
+    def _first_page(self):
+        rows = list(self._ordered(self.descending)[:self.per_page + 1])
+        return CursorPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page,
+            has_previous=False,
+        )
+
+    def _page_after(self, value, pk):
+        rows = list(
+            self._ordered(self.descending).filter(
+                self._beyond(value, pk, self.descending)
+            )[:self.per_page + 1]
+        )
+        return CursorPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page,
+            has_previous=True,
+        )
+
+    def _page_before(self, value, pk):
+        rows = list(
+            self._ordered(not self.descending).filter(
+                self._beyond(value, pk, not self.descending)
+            )[:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(
+            rows, self,
+            has_next=True,
+            has_previous=has_previous,
+        )
+
+    def _beyond(self, value, pk, descending):
+        """Условие "после позиции (value, pk)" в заданном порядке."""
+        lookup = 'lt' if descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def _ordered(self, descending):
+        prefix = '-' if descending else ''
+        return self.object_list.order_by(
+            f'{prefix}{self.field}', f'{prefix}pk'
+        )
+
+
+class KeysetPaginator(CursorPaginator):
+    """
+    CursorPaginator по составному порядку, например
+    ('-post_count', 'title', 'pk'): последнее поле уникально,
+    направления полей могут различаться. Значения ключа хранятся
+    в токене как JSON, поэтому поля - числа и строки.
+    """
+
+    def __init__(self, object_list, per_page, ordering):
+        super().__init__(object_list, per_page, field=None)
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+
+    def cursor_for(self, direction, obj):
+        values = [getattr(obj, name) for name, _ in self.ordering]
+        return urlsafe_base64_encode(json.dumps([direction, values]).encode())
+
+    def get_page(self, cursor):
+        position = self._decode(cursor) if cursor else None
+        if position is None:
+            return self._first_page()
+        direction, values = position
+        if direction == NEXT:
+            return self._page_after(values, None)
+        return self._page_before(values, None)
+
+    def _decode(self, cursor):
+        try:
+            direction, values = json.loads(
+                force_str(urlsafe_base64_decode(cursor))
+            )
+        except (TypeError, ValueError):
+            return None
+        if (direction not in (NEXT, PREVIOUS)
+                or not isinstance(values, list)
+                or len(values) != len(self.ordering)):
+            return None
+        return direction, values
+
+    # forward - порядок ordering, иначе обратный; у родителя этот
+    # аргумент называется descending, потому что прямой порядок там
+    # по убыванию даты
+
+    def _beyond(self, values, pk, forward):
+        """Лексикографическое "после values" в заданном порядке."""
+        condition = Q(pk__in=[])
+        for i, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending == forward else 'gt'
+            equal = {
+                prefix: value
+                for (prefix, _), value in zip(self.ordering[:i], values)
+            }
+            condition |= Q(**equal, **{f'{name}__{lookup}': values[i]})
+        return condition
+
+    def _ordered(self, forward):
+        return self.object_list.order_by(*(
+            f'{"-" if descending == forward else ""}{name}'
+            for name, descending in self.ordering
+        ))
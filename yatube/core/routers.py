@@ -0,0 +1,46 @@
+from contextvars import ContextVar
+
+# Маршрутизация текущего ответа (RequestRouting) или None вне ответа
+current_routing = ContextVar('current_routing', default=None)
+
+
+class RequestRouting:
+    def __init__(self):
+        # Алиас реплики для чтений; None - читать с default
+        self.replica = None
+        # Была ли в ответе запись: тогда читаем свои данные с default
+        self.wrote = False
+
+
+# Приложения, чьи чтения можно отдать реплике. Сессии и пользователи
+# читаются с default: отставшая реплика иначе разлогинит только что
+# вошедшего или оставит вошедшим вышедшего
+REPLICA_APPS = {'posts'}
+
+
+class ReplicaRouter:
+    """
+    Чтения моделей REPLICA_APPS в представлениях, отмеченных
+    ReplicaMiddleware, идут на выбранную для ответа реплику;
+    запись и всё остальное - в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or model._meta.app_label not in REPLICA_APPS:
+            return None
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же строки, что и в default
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схему реплики получают копированием из default
+        return db == 'default'
@@ -0,0 +1,178 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+from hashlib import sha1
+from time import perf_counter
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .metrics import escape_label, registry
+from .models import Task
+
+logger = logging.getLogger('core.tasks')
+
+# Имя задачи -> функция; заполняется декоратором task при импорте
+# модулей tasks приложений (CoreConfig.ready)
+tasks = {}
+
+# Метрика Prometheus -> (описание, поле queue_stats)
+QUEUE_GAUGES = {
+    'yatube_task_queue_depth': ('Задачи, ждущие запуска', 'depth'),
+    'yatube_task_oldest_seconds': (
+        'Возраст самой старой ждущей задачи', 'oldest_seconds'
+    ),
+    'yatube_task_failed': ('Задачи, упавшие после всех попыток', 'failed'),
+}
+
+
+def task(retries=3, retry_delay=10):
+    """
+    Регистрирует функцию как задачу. func.delay(*args) ставит вызов
+    в очередь и сразу возвращается; аргументы - то, что кладётся
+    в JSON (id, строки), а не модели: к запуску они могут устареть.
+
+    Упавшая задача повторяется до retries раз с паузой retry_delay
+    секунд, которая удваивается с каждой попыткой.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__name__}'
+        func.retries = retries
+        func.retry_delay = retry_delay
+        func.delay = lambda *args: enqueue(name, args)
+        tasks[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, args):
+    """
+    Ставит задачу в очередь; вызванная внутри транзакции появится
+    у воркеров только вместе с её данными. Та же задача с теми же
+    аргументами, ещё ждущая запуска, второй раз не ставится.
+
+    При TASKS_EAGER выполняется сразу, как при разработке и в тестах.
+    """
+    if settings.TASKS_EAGER:
+        tasks[name](*args)
+        return
+    args = json.dumps(list(args), sort_keys=True)
+    Task.objects.bulk_create(
+        [Task(
+            name=name, args=args,
+            key=sha1(f'{name}:{args}'.encode()).hexdigest(),
+        )],
+        ignore_conflicts=True
+    )
+
+
+def ready_tasks():
+    now = timezone.now()
+    return Task.objects.filter(failed=False, run_at__lte=now).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    )
+
+
+def claim(lease):
+    """
+    Берёт самую старую готовую задачу или возвращает None.
+
+    Захват - условный UPDATE: из воркеров, выбравших одну строку,
+    её получает только один, остальные пробуют следующую.
+    """
+    candidates = ready_tasks().order_by('run_at', 'pk').values_list(
+        'pk', flat=True
+    )[:10]
+    for pk in candidates:
+        claimed = ready_tasks().filter(pk=pk).update(
+            locked_until=timezone.now() + timedelta(seconds=lease),
+            key=None,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def run(row):
+    """Выполняет взятую задачу: успех удаляет строку, ошибка - повтор."""
+    func = tasks.get(row.name)
+    started = perf_counter()
+    wait = (timezone.now() - row.run_at).total_seconds()
+    try:
+        if func is None:
+            raise LookupError(f'Задача не зарегистрирована: {row.name}')
+        func(*json.loads(row.args))
+    except Exception:
+        logger.exception('Задача %s упала (попытка %d)', row, row.attempts)
+        retries = func.retries if func else 0
+        row.locked_until = None
+        row.error = traceback.format_exc()
+        if row.attempts > retries:
+            row.failed = True
+        else:
+            row.run_at = timezone.now() + timedelta(
+                seconds=func.retry_delay * 2 ** (row.attempts - 1)
+            )
+        row.save(update_fields=['locked_until', 'error', 'failed', 'run_at'])
+        succeeded = False
+    else:
+        row.delete()
+        succeeded = True
+    registry.observe(row.name, {
+        'yatube_task_wait_seconds': max(wait, 0),
+        'yatube_task_duration_seconds': perf_counter() - started,
+    })
+    return succeeded
+
+
+def work(lease=300, limit=None):
+    """Выполняет готовые задачи, пока они есть; возвращает их число."""
+    done = 0
+    while limit is None or done < limit:
+        row = claim(lease)
+        if row is None:
+            break
+        run(row)
+        done += 1
+        close_old_connections()
+    return done
+
+
+def queue_stats():
+    """Глубина очереди, возраст старейшей задачи и упавшие по именам."""
+    now = timezone.now()
+    rows = Task.objects.order_by().values('name', 'failed').annotate(
+        total=Count('pk'), oldest=Min('created')
+    )
+    stats = {}
+    for row in rows:
+        entry = stats.setdefault(
+            row['name'], {'depth': 0, 'oldest_seconds': 0, 'failed': 0}
+        )
+        if row['failed']:
+            entry['failed'] = row['total']
+        else:
+            entry['depth'] = row['total']
+            entry['oldest_seconds'] = (now - row['oldest']).total_seconds()
+    return stats
+
+
+def render_queue_stats():
+    """
+    Состояние очереди для /metrics: считается по таблице задач, поэтому
+    одинаково в любом процессе, в отличие от гистограмм воркеров.
+    """
+    stats = queue_stats()
+    lines = []
+    for metric, (description, field) in QUEUE_GAUGES.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} gauge')
+        for name, entry in sorted(stats.items()):
+            lines.append(
+                f'{metric}{{task="{escape_label(name)}"}} {entry[field]}'
+            )
+    return '\n'.join(lines) + '\n'
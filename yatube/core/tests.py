@@ -1,6 +1,30 @@
+import os
+import tempfile
+import threading
+import time
 from http import HTTPStatus
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings
+)
+from django.urls import resolve, reverse
+
+from posts.models import Follow, Post, Timeline
+from .cache import SQLiteCache
+from .executor import gather
+from .models import Task
+from .metrics import registry
+from .middleware import PIN_COOKIE, ReplicaMiddleware
+from .routers import current_routing, RequestRouting
+from .tasks import enqueue, task, work
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +34,371 @@ class ViewTestClass(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         # Проверьте, что используется шаблон core/404.html
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'ids': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'ids': [1, 2]})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'other'))
+
+    def test_shared_between_instances(self):
+        """Второй экземпляр (другой воркер) видит те же ключи."""
+        self.cache.set('key', 'value')
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), 'value')
+        other.delete('key')
+        self.assertFalse(self.cache.has_key('key'))
+
+    def test_timeout(self):
+        self.cache.set('key', 'value', timeout=0.05)
+        self.cache.set('forever', 'value', timeout=None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные ключи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache._connection().execute(
+            "UPDATE cache SET accessed = accessed + 10 WHERE key = ':1:a'"
+        )
+        cache.set('d', 'd')
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.get('d'), 'd')
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='metrics')
+        Post.objects.create(text='Пост', author=user)
+
+    def setUp(self):
+        registry.clear()
+
+    def metric(self, text, name, view):
+        prefix = f'{name}{{view="{view}"}} '
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return None
+
+    def test_histograms_by_view(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/nonexist-page/')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertEqual(
+            self.metric(
+                text, 'yatube_request_duration_seconds_count', 'posts:index'
+            ),
+            2
+        )
+        self.assertGreater(
+            self.metric(text, 'yatube_db_queries_sum', 'posts:index'), 0
+        )
+        self.assertGreater(
+            self.metric(
+                text, 'yatube_template_duration_seconds_sum', 'posts:index'
+            ),
+            0
+        )
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:index",le="+Inf"} 2', text
+        )
+        self.assertEqual(
+            self.metric(
+                text, 'yatube_request_duration_seconds_count', 'unmatched'
+            ),
+            1
+        )
+
+    @override_settings(METRICS_IPS=[])
+    def test_metrics_endpoint_restricted(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_logged_with_sql(self):
+        with self.assertLogs('core.metrics', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        Client().get(reverse('posts:index'))
+        self.assertNotIn('posts:index', registry.render())
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def route(self, path, method='get', cookies=None, write=False):
+        """Куда пошли чтения в ответе на path и ответ middleware."""
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        used = {}
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            used['read'] = router.db_for_read(Post)
+            if write:
+                used['write'] = router.db_for_write(Post)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        return used, middleware(request)
+
+    def test_feed_reads_go_to_replica(self):
+        for path in ('/', '/group/slug/', '/profile/user/', '/posts/1/',
+                     '/follow/'):
+            with self.subTest(path=path):
+                used, response = self.route(path)
+                self.assertEqual(used['read'], 'replica1')
+                self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_other_views_and_methods_read_primary(self):
+        self.assertEqual(self.route('/search/')[0]['read'], 'default')
+        self.assertEqual(self.route('/', method='post')[0]['read'], 'default')
+
+    def test_writes_pin_reads_to_primary(self):
+        used, response = self.route('/create/', method='post', write=True)
+        self.assertEqual(used['write'], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+        used, _ = self.route('/', cookies={PIN_COOKIE: '1'})
+        self.assertEqual(used['read'], 'default')
+
+    def test_outside_request_reads_primary(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_disabled_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaMiddleware(HttpResponse)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaSessionTest(TestCase):
+    def test_session_and_user_read_primary(self):
+        """
+        Сессия и пользователь читаются с default и в представлении
+        на реплике: алиаса replica1 в тестах нет, чтение с него упало бы.
+        """
+        user = get_user_model().objects.create_user(username='replica')
+        self.client.force_login(user)
+        request = RequestFactory().get('/follow/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = (
+            self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        )
+        request.resolver_match = resolve('/follow/')
+        seen = {}
+
+        def view(request):
+            replica_middleware.process_view(request, None, (), {})
+            seen['replica'] = current_routing.get().replica
+            seen['username'] = request.user.username
+            return HttpResponse()
+
+        replica_middleware = ReplicaMiddleware(view)
+        SessionMiddleware(AuthenticationMiddleware(replica_middleware))(
+            request
+        )
+        self.assertEqual(seen, {'replica': 'replica1', 'username': 'replica'})
+
+
+class SQLiteTuningTest(SimpleTestCase):
+    def pragmas(self):
+        """PRAGMA нового соединения Django к временному файлу."""
+        with tempfile.TemporaryDirectory() as directory:
+            default = connections['default']
+            wrapper = type(default)({
+                **default.settings_dict,
+                'NAME': os.path.join(directory, 'db.sqlite3'),
+            })
+            try:
+                with wrapper.cursor() as cursor:
+                    return {
+                        name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                        for name in ('journal_mode', 'synchronous',
+                                     'cache_size')
+                    }
+            finally:
+                wrapper.close()
+
+    @override_settings(SQLITE_TUNING=True)
+    def test_pragmas_on_new_connections(self):
+        self.assertEqual(
+            self.pragmas(),
+            # synchronous=NORMAL - это 1
+            {'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -65536}
+        )
+
+    @override_settings(SQLITE_TUNING=False)
+    def test_defaults_without_tuning(self):
+        self.assertEqual(self.pragmas()['journal_mode'], 'delete')
+
+
+class GatherTest(SimpleTestCase):
+    @override_settings(DB_EXECUTOR_WORKERS=2)
+    def test_calls_run_concurrently_in_order(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet(value):
+            # Дождаться второй функции можно, только если они идут вместе
+            barrier.wait()
+            return value, threading.current_thread().name
+
+        first, second = gather(lambda: meet(1), lambda: meet(2))
+        self.assertEqual(first, (1, threading.current_thread().name))
+        self.assertEqual(second[0], 2)
+        self.assertTrue(second[1].startswith('db'))
+
+    @override_settings(DB_EXECUTOR_WORKERS=2, DATABASE_REPLICAS=['replica1'])
+    def test_routing_context_reaches_pool(self):
+        routing = RequestRouting()
+        routing.replica = 'replica1'
+        token = current_routing.set(routing)
+        try:
+            used = gather(
+                lambda: None, lambda: router.db_for_read(Post)
+            )[1]
+        finally:
+            current_routing.reset(token)
+        self.assertEqual(used, 'replica1')
+
+    @override_settings(DB_EXECUTOR_WORKERS=2)
+    def test_errors_propagate(self):
+        def fail():
+            raise LookupError
+
+        with self.assertRaises(LookupError):
+            gather(lambda: None, fail)
+
+    @override_settings(DB_EXECUTOR_WORKERS=0)
+    def test_serial_without_workers(self):
+        names = gather(
+            lambda: threading.current_thread().name,
+            lambda: threading.current_thread().name,
+        )
+        self.assertEqual(names, [threading.current_thread().name] * 2)
+
+
+class GatherMetricsTest(TransactionTestCase):
+    """
+    Запросы из потоков пула видны соединениям только после коммита,
+    поэтому данные здесь сохраняются без транзакции теста.
+    """
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='metrics')
+        self.post = Post.objects.create(text='Пост', author=user)
+
+    def db_queries(self, workers):
+        registry.clear()
+        with override_settings(DB_EXECUTOR_WORKERS=workers):
+            response = self.client.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            )
+        self.assertEqual(response.status_code, 200)
+        text = self.client.get(reverse('metrics')).content.decode()
+        prefix = 'yatube_db_queries_sum{view="posts:post_detail"} '
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return None
+
+    def test_pool_queries_are_counted(self):
+        serial = self.db_queries(0)
+        self.assertGreater(serial, 1)
+        self.assertEqual(self.db_queries(2), serial)
+
+
+CALLS = []
+
+
+@task(retries=1, retry_delay=0)
+def record_call(value):
+    CALLS.append(value)
+
+
+@task(retries=1, retry_delay=0)
+def broken_task():
+    raise ValueError('сломано')
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+        registry.clear()
+
+    def test_identical_waiting_tasks_coalesce(self):
+        record_call.delay(1)
+        record_call.delay(1)
+        record_call.delay(2)
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(CALLS, [])
+        self.assertEqual(work(), 2)
+        self.assertEqual(CALLS, [1, 2])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_task_retried_then_kept(self):
+        broken_task.delay()
+        with self.assertLogs('core.tasks', 'ERROR'):
+            work()
+        row = Task.objects.get()
+        self.assertTrue(row.failed)
+        self.assertEqual(row.attempts, 2)
+        self.assertIn('сломано', row.error)
+
+    def test_unknown_task_fails_without_retries(self):
+        enqueue('core.tests.missing', [])
+        with self.assertLogs('core.tasks', 'ERROR'):
+            work()
+        self.assertTrue(Task.objects.get().failed)
+
+    def test_queue_gauges_in_metrics(self):
+        record_call.delay(1)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_task_queue_depth{task="core.tests.record_call"} 1', text
+        )
+        work()
+        self.assertIn(
+            'yatube_task_duration_seconds_count'
+            '{task="core.tests.record_call"} 1',
+            registry.render()
+        )
+
+    def test_timeline_filled_by_worker(self):
+        user, author = (
+            get_user_model().objects.create_user(username=name)
+            for name in ('reader', 'author')
+        )
+        Follow.objects.create(user=user, author=author)
+        post = Post.objects.create(text='Пост', author=author)
+        self.assertFalse(Timeline.objects.exists())
+        work()
+        self.assertEqual(
+            list(Timeline.objects.values_list('user', 'post')),
+            [(user.pk, post.pk)]
+        )
@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry
+from .tasks import render_queue_stats
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию,
@@ -17,3 +22,13 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    # Метрики процесса для Prometheus; доступны только с METRICS_IPS
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render() + render_queue_stats(),
+        content_type='text/plain; version=0.0.4'
+    )
@@ -18,7 +18,7 @@ class PostAdmin(admin.ModelAdmin):
 
 
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title')
+    list_display = ('id', 'title', 'post_count')
     list_display_links = ('id', 'title')
     prepopulated_fields = {"slug": ("title",)}
 
@@ -0,0 +1,25 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+
+FEED_VERSION_KEY = 'posts:feed_version'
+# Сколько живут списки id страниц ленты
+PAGE_TIMEOUT = 60 * 5
+
+
+def feed_version():
+    """Текущая версия лент: входит в ключи закэшированных страниц."""
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        cache.add(FEED_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+
+def invalidate_feeds():
+    """Делает устаревшими списки id всех закэшированных страниц."""
+    cache.set(FEED_VERSION_KEY, uuid4().hex, None)
+
+
+def page_key(feed, request):
+    return f'posts:page:{feed}:{feed_version()}:{request.GET.urlencode()}'
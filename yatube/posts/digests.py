@@ -0,0 +1,70 @@
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notification
+
+
+def digest_message(recipient, notifications, connection):
+    """Одно письмо со всеми непрочитанными уведомлениями получателя."""
+    context = {
+        'user': recipient,
+        'notifications': notifications[:settings.DIGEST_ITEMS],
+        'more': max(len(notifications) - settings.DIGEST_ITEMS, 0),
+        'site_url': settings.SITE_URL,
+    }
+    return EmailMessage(
+        render_to_string('posts/email/digest_subject.txt', context).strip(),
+        render_to_string('posts/email/digest.txt', context),
+        to=[recipient.email],
+        connection=connection,
+    )
+
+
+def send_digests(batch_size=500):
+    """
+    Рассылает дайджесты уведомлений, созданных до запуска: одно письмо
+    на пользователя за окно между запусками. Получатели берутся
+    пачками, уведомления пачки читаются одним запросом и одним
+    UPDATE отмечаются разосланными. Возвращает число писем.
+
+    Прочитанное на сайте и пользователи без email отмечаются,
+    но в письмо не попадают.
+    """
+    pending = Notification.objects.filter(
+        emailed=False, created__lte=timezone.now()
+    )
+    last_id = 0
+    sent = 0
+    with get_connection() as connection:
+        while True:
+            recipients = list(
+                pending.filter(recipient_id__gt=last_id).order_by(
+                    'recipient_id'
+                ).values_list('recipient_id', flat=True).distinct()[
+                    :batch_size
+                ]
+            )
+            if not recipients:
+                break
+            batch = pending.filter(recipient_id__in=recipients)
+            notifications = batch.filter(read=False).select_related(
+                'recipient', 'actor', 'post'
+            ).order_by('recipient_id', 'created', 'pk')
+            messages = []
+            for _, items in groupby(
+                notifications, key=lambda item: item.recipient_id
+            ):
+                items = list(items)
+                recipient = items[0].recipient
+                if recipient.email and recipient.is_active:
+                    messages.append(
+                        digest_message(recipient, items, connection)
+                    )
+            sent += connection.send_messages(messages) or 0
+            batch.update(emailed=True)
+            last_id = recipients[-1]
+    return sent
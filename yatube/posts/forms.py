@@ -18,6 +18,15 @@ class PostForm(forms.ModelForm):
             'image': 'Добавить картинку'
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Картинку отклонил LimitedImageUploadHandler ещё при загрузке
+        rejection = getattr(self.files.get('image'), 'rejection', None)
+        if rejection:
+            self.errors.pop('image', None)
+            self.add_error('image', rejection)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
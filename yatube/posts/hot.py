@@ -0,0 +1,108 @@
+import heapq
+from datetime import timedelta
+from math import log2
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .models import HotPost
+
+# Веса событий в рейтинге "Популярное"
+POST_WEIGHT = 1.0
+COMMENT_WEIGHT = 1.0
+FOLLOW_WEIGHT = 0.5
+# Начало отсчёта затухания (2020-01-01 UTC): rank растёт на 1
+# за каждые HOT_HALF_LIFE секунд от него
+EPOCH = 1577836800
+# Сколько раз повторить обновление, если строку изменили параллельно
+ATTEMPTS = 10
+# Глубина пересчёта в периодах полураспада от последнего события:
+# вклад более старых событий теряется в точности float
+REBUILD_HALF_LIVES = 64
+
+
+def event_rank(weight, timestamp):
+    """log2 вклада события веса weight в момент timestamp."""
+    return log2(weight) + (timestamp - EPOCH) / settings.HOT_HALF_LIFE
+
+
+def combine(first, second):
+    """log2(2 ** first + 2 ** second) без переполнения."""
+    high, low = max(first, second), min(first, second)
+    return high + log2(1 + 2 ** (low - high))
+
+
+def bump(post_id, weight, timestamp):
+    """
+    Добавляет событие к рейтингу поста. Запись - условный UPDATE
+    по прочитанному значению: из параллельных обновлений одной
+    строки проходит одно, остальные перечитывают и повторяют.
+
+    Возвращает True, если строка поста добавлена: после этого
+    таблицу нужно обрезать (HotPost.trim).
+    """
+    value = event_rank(weight, timestamp)
+    for _ in range(ATTEMPTS):
+        current = HotPost.objects.filter(post_id=post_id).values_list(
+            'rank', flat=True
+        ).first()
+        if current is None:
+            try:
+                with transaction.atomic():
+                    HotPost.objects.create(post_id=post_id, rank=value)
+                return True
+            except IntegrityError:
+                continue
+        if HotPost.objects.filter(post_id=post_id, rank=current).update(
+            rank=combine(current, value)
+        ):
+            return False
+    raise RuntimeError(f'Рейтинг поста {post_id} не обновлён')
+
+
+def rebuild(hot_model, post_model, comment_model):
+    """
+    Заново собирает рейтинг по недавним постам и комментариям и
+    оставляет HOT_POSTS лучших. Подписки не хранят дату и в пересчёт
+    не входят. Модели передаются параметрами, чтобы пересчёт мог
+    вызвать и миграция с историческими моделями.
+
+    Возвращает число строк в таблице.
+    """
+    hot_model.objects.all().delete()
+    dates = [
+        date for date in (
+            model.objects.aggregate(last=Max('pub_date'))['last']
+            for model in (post_model, comment_model)
+        ) if date is not None
+    ]
+    if not dates:
+        return 0
+    since = max(dates) - timedelta(
+        seconds=settings.HOT_HALF_LIFE * REBUILD_HALF_LIVES
+    )
+    ranks = {}
+    events = (
+        (post_model.objects.filter(pub_date__gte=since).values_list(
+            'pk', 'pub_date'
+        ), POST_WEIGHT),
+        (comment_model.objects.filter(pub_date__gte=since).values_list(
+            'post_id', 'pub_date'
+        ), COMMENT_WEIGHT),
+    )
+    for rows, weight in events:
+        for post_id, pub_date in rows.order_by().iterator():
+            value = event_rank(weight, pub_date.timestamp())
+            current = ranks.get(post_id)
+            ranks[post_id] = (
+                value if current is None else combine(current, value)
+            )
+    best = heapq.nlargest(
+        settings.HOT_POSTS, ranks.items(), key=lambda item: item[1]
+    )
+    hot_model.objects.bulk_create(
+        (hot_model(post_id=post_id, rank=rank) for post_id, rank in best),
+        batch_size=1000
+    )
+    return len(best)
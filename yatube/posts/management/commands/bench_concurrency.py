@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from .bench_views import Command as ViewsCommand, percentile
+
+# Страницы, которые читают независимые данные через gather
+VIEWS = ('group_posts', 'profile', 'post_detail')
+
+
+class Command(ViewsCommand):
+    help = (
+        'Засевает временную базу и меряет задержку страниц под '
+        'нагрузкой из нескольких клиентских потоков: чтения по очереди '
+        '(DB_EXECUTOR_WORKERS = 0) против одновременных в пуле потоков. '
+        'Рабочая база не затрагивается.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Одновременных клиентов')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='DB_EXECUTOR_WORKERS для режима gather')
+
+    def handle(self, *args, **options):
+        # Общая база в памяти блокирует таблицы целиком и не ждёт,
+        # поэтому временная база - файл в режиме WAL, как в продакшене,
+        # с постоянными соединениями потоков
+        database = connection.settings_dict
+        saved = database['TEST']['NAME'], database['CONN_MAX_AGE']
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(SQLITE_TUNING=True):
+            database['TEST']['NAME'] = os.path.join(
+                directory, 'bench.sqlite3'
+            )
+            database['CONN_MAX_AGE'] = 600
+            try:
+                super().handle(*args, **options)
+            finally:
+                database['TEST']['NAME'], database['CONN_MAX_AGE'] = saved
+
+    def measure(self, options):
+        reader, targets = self.targets()
+        urls = {name: url for name, _, url, _ in targets if name in VIEWS}
+        results = {}
+        for mode, workers in (('serial', 0), ('gather', options['workers'])):
+            with override_settings(DB_EXECUTOR_WORKERS=workers):
+                for name, url in urls.items():
+                    cache.clear()
+                    results[f'{name}_{mode}'] = self.load(
+                        reader, url, options
+                    )
+        return results
+
+    def load(self, reader, url, options):
+        """Каждый клиент шлёт --requests запросов, все одновременно."""
+        login = Client()
+        login.force_login(reader)
+        timings = []
+        failures = []
+        start = threading.Barrier(options['clients'])
+
+        def client_thread():
+            try:
+                client = Client()
+                client.cookies = login.cookies
+                client.get(url)
+                start.wait()
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append(time.perf_counter() - started)
+                    if response.status_code >= 400:
+                        failures.append(response.status_code)
+            except Exception as error:
+                # Без этого остальные клиенты ждали бы у барьера вечно
+                start.abort()
+                failures.append(repr(error))
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=client_thread)
+            for _ in range(options['clients'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if failures:
+            raise CommandError(f'{url}: {sorted(set(map(str, failures)))}')
+        return {
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+            'rps': round(len(timings) / elapsed, 1),
+        }
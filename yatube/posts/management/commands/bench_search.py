@@ -0,0 +1,74 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import FTS_CREATE, FTS_TABLE
+
+WORDS = (
+    'лев толстой война мир анна каренина воскресение казаки детство '
+    'отрочество юность севастополь рассказы дневник письма роман повесть '
+    'народ земля правда вера любовь смерть жизнь время дорога дом'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск FTS5 и LIKE на синтетической базе '
+        'в отдельном временном файле SQLite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'search.sqlite3'))
+            db.execute('CREATE TABLE posts_post (id INTEGER PRIMARY KEY, '
+                       'text TEXT NOT NULL)')
+            db.execute(FTS_CREATE)
+            started = time.perf_counter()
+            for start in range(0, options['posts'], 10000):
+                rows = [
+                    (pk, ' '.join(rnd.choices(WORDS, k=30)) + f' слово{pk}')
+                    for pk in range(
+                        start + 1, min(start + 10000, options['posts']) + 1
+                    )
+                ]
+                db.executemany('INSERT INTO posts_post VALUES (?, ?)', rows)
+                db.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (?, ?)',
+                    rows
+                )
+            db.commit()
+            self.stdout.write(
+                f'Засеяно {options["posts"]} постов за '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            queries = [
+                f'слово{rnd.randint(1, options["posts"])}'
+                for _ in range(options['queries'])
+            ]
+            like = self.measure(db, queries, (
+                'SELECT id FROM posts_post WHERE text LIKE ? '
+                'ORDER BY id DESC LIMIT 10'
+            ), lambda word: f'%{word}%')
+            fts = self.measure(db, queries, (
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? '
+                f'ORDER BY bm25({FTS_TABLE}) LIMIT 10'
+            ), lambda word: f'"{word}"')
+            db.close()
+        self.stdout.write(f' LIKE: {like * 1000:.2f} мс на запрос')
+        self.stdout.write(f' FTS5: {fts * 1000:.2f} мс на запрос')
+
+    def measure(self, db, queries, sql, param):
+        started = time.perf_counter()
+        for word in queries:
+            rows = db.execute(sql, (param(word),)).fetchall()
+            assert rows, word
+        return (time.perf_counter() - started) / len(queries)
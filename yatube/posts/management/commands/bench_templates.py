@@ -0,0 +1,115 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import Engine
+from django.template.backends.django import get_installed_libraries
+from django.template.context import RequestContext
+from django.test import RequestFactory
+from django.utils import timezone
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def make_posts(number):
+    """Посты в памяти, без БД: меряется только рендер."""
+    now = timezone.now()
+    group = Group(pk=1, title='Группа', slug='group')
+    authors = [
+        User(pk=i, username=f'user{i}', first_name='Лев', last_name=str(i))
+        for i in range(1, 11)
+    ]
+    return [
+        Post(
+            pk=i, text=f'Текст поста {i} ' * 20, pub_date=now, updated=now,
+            author=authors[i % len(authors)], group=group,
+            comment_count=i % 7,
+        )
+        for i in range(1, number + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Меряет рендер ленты posts/index.html на 10 и 100 постов: '
+        'обычные загрузчики против cached.Loader, с холодным и тёплым '
+        'кэшем карточек'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100])
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести отчёт в JSON')
+
+    def handle(self, *args, **options):
+        engine_options = {
+            'dirs': [settings.TEMPLATES_DIR],
+            'context_processors': (
+                settings.TEMPLATES[0]['OPTIONS']['context_processors']
+            ),
+            'libraries': get_installed_libraries(),
+        }
+        engines = {
+            'plain': Engine(loaders=LOADERS, **engine_options),
+            'cached': Engine(
+                loaders=[('django.template.loaders.cached.Loader', LOADERS)],
+                **engine_options
+            ),
+        }
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        report = []
+        for size in options['sizes']:
+            page = Paginator(make_posts(size), size).page(1)
+            for loader, engine in engines.items():
+                for card_cache in ('cold', 'warm'):
+                    timings = self.measure(
+                        engine, request, page, options['repeat'],
+                        cold=card_cache == 'cold'
+                    )
+                    report.append({
+                        'posts': size,
+                        'loader': loader,
+                        'card_cache': card_cache,
+                        'median_ms': round(statistics.median(timings), 3),
+                    })
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for row in report:
+            self.stdout.write(
+                f"{row['posts']:>4} постов, {row['loader']:>6}, "
+                f"кэш карточек {row['card_cache']}: "
+                f"{row['median_ms']:.2f} мс"
+            )
+
+    def measure(self, engine, request, page, repeat, cold):
+        context = {'page_obj': page}
+        # Прогрев: компиляция шаблонов в cached.Loader
+        engine.get_template('posts/index.html').render(
+            RequestContext(request, context)
+        )
+        timings = []
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            started = time.perf_counter()
+            engine.get_template('posts/index.html').render(
+                RequestContext(request, context)
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,212 @@
+import json
+import random
+import time
+import tracemalloc
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'лев толстой война мир анна каренина воскресение казаки детство '
+    'отрочество юность севастополь рассказы дневник письма роман'
+).split()
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Засевает временную базу синтетическими данными и меряет '
+        'задержку, число запросов и пиковую память для URL постов. '
+        'Рабочая база не затрагивается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов на каждый URL')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+        parser.add_argument(
+            '--baseline',
+            help='JSON-отчёт прошлого запуска для сравнения'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p50 и числа запросов относительно baseline'
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        # Без DEBUG: не копится журнал запросов и не встраивается
+        # debug toolbar, как в боевом окружении
+        with override_settings(DEBUG=False):
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                report = {
+                    'dataset': self.seed(options),
+                    'views': self.measure(options),
+                }
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(text)
+        self.stdout.write(text)
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
+
+    def seed(self, options):
+        """Массовая вставка данных; счётчики и индексы - одним проходом."""
+        rnd = random.Random(options['seed'])
+        started = time.perf_counter()
+        User.objects.bulk_create(
+            User(username=f'user{i}', first_name='Пользователь',
+                 last_name=str(i), password='!')
+            for i in range(options['users'])
+        )
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}', description='')
+            for i in range(options['groups'])
+        )
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        Post.objects.bulk_create(
+            (
+                Post(
+                    text=' '.join(rnd.choices(WORDS, k=20)),
+                    author_id=rnd.choice(user_ids),
+                    group_id=rnd.choice(group_ids + [None]),
+                )
+                for _ in range(options['posts'])
+            )
+        )
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    text=' '.join(rnd.choices(WORDS, k=8)),
+                    author_id=rnd.choice(user_ids),
+                    post_id=rnd.choice(post_ids),
+                )
+                for _ in range(options['comments'])
+            )
+        )
+        pairs = {
+            tuple(rnd.sample(user_ids, 2)) for _ in range(options['follows'])
+        }
+        # user0 - читатель ленты подписок; его подписки идут через сигналы
+        reader = User.objects.get(username='user0')
+        Follow.objects.bulk_create(
+            Follow(user_id=user, author_id=author)
+            for user, author in pairs if user != reader.pk
+        )
+        for author_id in rnd.sample(user_ids[1:], 20):
+            Follow.objects.create(user=reader, author_id=author_id)
+        call_command('recount_counters', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        return {
+            'users': len(user_ids),
+            'groups': len(group_ids),
+            'posts': len(post_ids),
+            'comments': options['comments'],
+            'follows': Follow.objects.count(),
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+
+    def targets(self):
+        reader = User.objects.get(username='user0')
+        busy_post = Post.objects.order_by('-comment_count').first()
+        author = User.objects.order_by('-stats__post_count').first()
+        group = Group.objects.order_by('-post_count').first()
+        return reader, [
+            ('index', 'get', reverse('posts:index'), None),
+            ('index_page_100', 'get',
+             reverse('posts:index') + '?page=100', None),
+            ('group_posts', 'get',
+             reverse('posts:group_list', args=[group.slug]), None),
+            ('profile', 'get',
+             reverse('posts:profile', args=[author.username]), None),
+            ('post_detail', 'get',
+             reverse('posts:post_detail', args=[busy_post.pk]), None),
+            ('follow_index', 'get', reverse('posts:follow_index'), None),
+            ('add_comment', 'post',
+             reverse('posts:add_comment', args=[busy_post.pk]),
+             {'text': 'Комментарий из бенчмарка'}),
+            ('post_create', 'post', reverse('posts:post_create'),
+             {'text': 'Пост из бенчмарка'}),
+        ]
+
+    def measure(self, options):
+        reader, targets = self.targets()
+        client = Client()
+        client.force_login(reader)
+        cache.clear()
+        results = {}
+        for name, method, url, data in targets:
+            request = getattr(client, method)
+            # Прогрев: кэши шаблонов, страниц и соединение
+            request(url, data)
+            with CaptureQueriesContext(connection) as queries:
+                response = request(url, data)
+            # Журнал запросов сбрасывается в начале следующего запроса
+            query_count = len(queries)
+            if response.status_code >= 400:
+                raise CommandError(f'{name}: ответ {response.status_code}')
+            timings = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                request(url, data)
+                timings.append(time.perf_counter() - started)
+            tracemalloc.start()
+            request(url, data)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name] = {
+                'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+                'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+                'queries': query_count,
+                'peak_kb': round(peak / 1024, 1),
+            }
+        return results
+
+    def compare(self, report, baseline_path, tolerance):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['views']
+        regressions = []
+        for name, result in report['views'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            for metric in ('p50_ms', 'queries'):
+                if metric not in result or metric not in before:
+                    continue
+                if result[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(
+                        f'{name}.{metric}: {before[metric]} -> '
+                        f'{result[metric]}'
+                    )
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
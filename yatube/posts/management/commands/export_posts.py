@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TABLES, export_images, export_table
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в каталог: по файлу JSON Lines или CSV на таблицу'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк читать из БД за раз'
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='Куда скопировать файлы картинок постов'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        os.makedirs(directory, exist_ok=True)
+        for table in TABLES:
+            count = export_table(
+                directory, table, options['format'], options['batch_size']
+            )
+            self.stdout.write(f'{table}: {count}')
+        if options['media_dir']:
+            copied = export_images(options['media_dir'], options['batch_size'])
+            self.stdout.write(f'картинок: {copied}')
+        self.stdout.write(self.style.SUCCESS(f'Выгружено в {directory}'))
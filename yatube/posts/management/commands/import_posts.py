@@ -0,0 +1,48 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from posts.models import Comment, Post
+from posts.transfer import FORMATS, TABLES, Importer, keep_dates
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_posts пачками bulk_create, '
+        'затем пересчитывает счётчики, поисковый индекс, рейтинг '
+        '"Популярное" и ленты подписок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк держать в памяти и вставлять за раз'
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='Откуда скопировать файлы картинок постов в MEDIA_ROOT'
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            options['directory'], options['format'],
+            options['batch_size'], options['media_dir']
+        )
+        try:
+            with transaction.atomic(), keep_dates(Post, Comment):
+                for table in TABLES:
+                    count = importer.load(table)
+                    if count is not None:
+                        self.stdout.write(f'{table}: {count}')
+                call_command('recount_counters', stdout=StringIO())
+                call_command('rebuild_search_index', stdout=StringIO())
+                call_command('rebuild_hot_posts', stdout=StringIO())
+                rebuilt = importer.rebuild_timelines()
+        except (IntegrityError, ValueError, KeyError, OSError) as error:
+            raise CommandError(f'Загрузка отменена: {error!r}')
+        self.stdout.write(f'авторов, разложенных по лентам: {rebuilt}')
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
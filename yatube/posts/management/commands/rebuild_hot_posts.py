@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import hot
+from posts.models import Comment, HotPost, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг "Популярное" по недавним постам и '
+        'комментариям (после bulk-импорта)'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = hot.rebuild(HotPost, Post, Comment)
+        self.stdout.write(self.style.SUCCESS(f'Постов в рейтинге: {posts}'))
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def count_subquery(queryset, field):
+    """Подзапрос COUNT(*) по внешнему ключу field для update()."""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и комментариев одним проходом'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create счётчиков пользователей'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            posts = Post.objects.update(
+                comment_count=count_subquery(Comment.objects, 'post')
+            )
+            groups = Group.objects.update(
+                post_count=count_subquery(Post.objects, 'group')
+            )
+            UserStats.objects.all().delete()
+            authors = User.objects.annotate(
+                total=Count('posts')
+            ).filter(total__gt=0).values_list('pk', 'total')
+            UserStats.objects.bulk_create(
+                (
+                    UserStats(user_id=pk, post_count=total)
+                    for pk, total in authors.iterator()
+                ),
+                batch_size=batch_size
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: постов {posts}, групп {groups}, '
+            f'авторов {UserStats.objects.count()}'
+        ))
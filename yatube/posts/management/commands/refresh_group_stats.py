@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import GroupStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает сводки групп для каталога: дату последнего поста '
+        'и самых активных авторов; запускается по расписанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int,
+                            default=settings.GROUP_TOP_AUTHORS,
+                            help='Авторов на группу')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        groups = GroupStats.refresh(options['top'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Групп: {groups}'))
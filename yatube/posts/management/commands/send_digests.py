@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылает письма-дайджесты уведомлений, накопившихся с прошлого '
+        'запуска; запускается по расписанию, например раз в час'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Получателей в одной пачке')
+
+    def handle(self, *args, **options):
+        sent = send_digests(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Писем: {sent}'))
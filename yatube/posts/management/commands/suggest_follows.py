@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import rebuild_suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации авторов для подписки по графам '
+        'подписок, комментариев и групп'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int,
+                            default=settings.FOLLOW_SUGGESTIONS,
+                            help='Рекомендаций на пользователя')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stored = rebuild_suggestions(options['limit'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Рекомендаций: {stored}'))
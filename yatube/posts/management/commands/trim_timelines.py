@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.models import Timeline
+
+
+class Command(BaseCommand):
+    help = 'Обрезает ленты подписок до TIMELINE_LENGTH записей'
+
+    def handle(self, *args, **options):
+        overflowing = Timeline.objects.order_by().values('user').annotate(
+            total=Count('pk')
+        ).filter(total__gt=settings.TIMELINE_LENGTH).values_list(
+            'user', flat=True
+        )
+        trimmed = 0
+        for user_id in overflowing.iterator():
+            Timeline.trim(user_id)
+            trimmed += 1
+        self.stdout.write(self.style.SUCCESS(f'Обрезано лент: {trimmed}'))
@@ -0,0 +1,76 @@
+# Generated by Django 2.2.28 on 2026-10-18 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+from collections import Counter
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    fts5 = False
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts '
+                    'USING fts5(text)'
+                )
+            except Exception:
+                pass
+            else:
+                fts5 = True
+    # Заполняется индекс, из которого будет читать настроенный
+    # SEARCH_BACKEND (posts.search.backend)
+    backend = settings.SEARCH_BACKEND
+    if backend == 'auto':
+        backend = 'fts5' if fts5 else 'python'
+    if backend == 'fts5' and fts5:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO posts_post_fts (rowid, text) '
+                'SELECT id, text FROM posts_post'
+            )
+        return
+    Post = apps.get_model('posts', 'Post')
+    PostTerm = apps.get_model('posts', 'PostTerm')
+    PostTerm.objects.bulk_create(
+        (
+            PostTerm(post_id=pk, term=term, count=count)
+            for pk, text in Post.objects.values_list('pk', 'text').iterator()
+            for term, count in Counter(
+                word[:64] for word in re.findall(r'\w+', text.lower())
+            ).items()
+        ),
+        batch_size=1000
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='postterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_post_term'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from posts import hot
+
+
+def fill_hot_posts(apps, schema_editor):
+    hot.rebuild(
+        apps.get_model('posts', 'HotPost'),
+        apps.get_model('posts', 'Post'),
+        apps.get_model('posts', 'Comment'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotPost',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hot', serialize=False, to='posts.Post')),
+                ('rank', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='hotpost',
+            index=models.Index(fields=['-rank'], name='posts_hotpo_rank_9d7c76_idx'),
+        ),
+        migrations.RunPython(fill_hot_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:42
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.filter(group__isnull=False).order_by()
+    last_dates = dict(posts.values('group').annotate(
+        last=Max('pub_date')
+    ).values_list('group', 'last'))
+    authors = {}
+    rows = posts.values('group', 'author__username').annotate(
+        total=Count('pk')
+    ).order_by('group', '-total', 'author__username')
+    for row in rows.iterator():
+        top = authors.setdefault(row['group'], [])
+        if len(top) < settings.GROUP_TOP_AUTHORS:
+            top.append([row['author__username'], row['total']])
+    GroupStats.objects.bulk_create(
+        (
+            GroupStats(
+                group_id=pk,
+                last_post_date=last_dates.get(pk),
+                top_authors=json.dumps(
+                    authors.get(pk, []), ensure_ascii=False
+                ),
+            )
+            for pk in Group.objects.values_list('pk', flat=True).iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_hot_posts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('last_post_date', models.DateTimeField(null=True, verbose_name='Последний пост')),
+                ('top_authors', models.TextField(default='[]')),
+                ('refreshed', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-post_count', 'title'], name='posts_group_post_co_1b7ccd_idx'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
-from django.db.models import Q, F
+import json
+from itertools import islice
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Max, Q, F
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
@@ -14,10 +18,40 @@ class Group(models.Model):
     slug = models.SlugField(max_length=255, unique=True,
                             db_index=True, verbose_name="URL")
     description = models.TextField()
+    post_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False
+    )
+
+    class Meta:
+        # Каталог групп: самые большие первыми, по индексу
+        indexes = [
+            models.Index(fields=['-post_count', 'title']),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def change_post_count(cls, group_id, delta):
+        if group_id is None:
+            return
+        groups = cls.objects.filter(pk=group_id)
+        if delta < 0:
+            groups = groups.filter(post_count__gte=-delta)
+        groups.update(post_count=F('post_count') + delta)
+
+
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа одним JOIN, число комментариев."""
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug', 'comment_count', 'updated',
+        )
+
 
 class Post(PubdateModel):
     text = models.TextField(
@@ -44,10 +78,41 @@ class Post(PubdateModel):
         upload_to='posts/',
         blank=True
     )
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta(PubdateModel.Meta):
+        # Ленты автора и группы: фильтр и сортировка по одному индексу
+        indexes = [
+            models.Index(fields=['author', '-pub_date']),
+            models.Index(fields=['group', '-pub_date']),
+        ]
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        # Счётчики автора и групп меняются в той же транзакции, что и пост
+        with transaction.atomic():
+            adding = self._state.adding
+            old_group_id = None
+            if not adding:
+                old_group_id = Post.objects.filter(pk=self.pk).values_list(
+                    'group_id', flat=True
+                ).first()
+            super().save(*args, **kwargs)
+            if adding:
+                UserStats.increment(self.author_id)
+            if old_group_id != self.group_id:
+                Group.change_post_count(old_group_id, -1)
+                Group.change_post_count(self.group_id, 1)
+
 
 class Comment(PubdateModel):
     post = models.ForeignKey(
@@ -65,9 +130,24 @@ class Comment(PubdateModel):
         help_text='Введите текст комментария'
     )
 
+    class Meta(PubdateModel.Meta):
+        # Комментарии поста по порядку без сортировки во временном B-дереве
+        indexes = [
+            models.Index(fields=['post', 'pub_date']),
+        ]
+
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                Post.objects.filter(pk=self.post_id).update(
+                    comment_count=F('comment_count') + 1
+                )
+
 
 class Follow(models.Model):
     # пользователь, который подписывается
@@ -95,3 +175,366 @@ class Follow(models.Model):
     def clean(self):
         if self.author == self.user:
             raise ValidationError({'author':('Что то не так!')})
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    post_count = models.PositiveIntegerField('Число постов', default=0)
+
+    def __str__(self):
+        return f'{self.user}: {self.post_count}'
+
+    @classmethod
+    def increment(cls, user_id):
+        updated = cls.objects.filter(user_id=user_id).update(
+            post_count=F('post_count') + 1
+        )
+        if updated:
+            return
+        # Первая запись считается по факту, чтобы учесть старые посты.
+        # Точка сохранения: строку мог успеть создать параллельный пост,
+        # тогда ошибка откатывает только вставку и счётчик увеличивается
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id,
+                    post_count=Post.objects.filter(author_id=user_id).count()
+                )
+        except IntegrityError:
+            cls.objects.filter(user_id=user_id).update(
+                post_count=F('post_count') + 1
+            )
+
+    @classmethod
+    def decrement(cls, user_id):
+        cls.objects.filter(user_id=user_id, post_count__gt=0).update(
+            post_count=F('post_count') - 1
+        )
+
+
+class GroupStats(models.Model):
+    """
+    Сводка группы для каталога: дата последнего поста и самые
+    активные авторы. Дата сдвигается при каждом посте, авторы
+    пересчитываются периодически командой refresh_group_stats.
+    """
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    last_post_date = models.DateTimeField('Последний пост', null=True)
+    # JSON: [[username, число постов], ...] по убыванию числа постов
+    top_authors = models.TextField(default='[]')
+    refreshed = models.DateTimeField('Пересчитано', auto_now=True)
+
+    def __str__(self):
+        return f'{self.group}: {self.last_post_date}'
+
+    @property
+    def authors(self):
+        return [
+            {'username': username, 'post_count': total}
+            for username, total in json.loads(self.top_authors)
+        ]
+
+    @classmethod
+    def touch(cls, group_id, pub_date):
+        """Сдвигает дату последнего поста группы вперёд."""
+        updated = cls.objects.filter(group_id=group_id).filter(
+            Q(last_post_date__isnull=True) | Q(last_post_date__lt=pub_date)
+        ).update(last_post_date=pub_date)
+        if not updated:
+            cls.objects.get_or_create(
+                group_id=group_id, defaults={'last_post_date': pub_date}
+            )
+
+    @classmethod
+    def refresh(cls, top_authors, batch_size=1000):
+        """
+        Пересчитывает сводки всех групп двумя GROUP BY по постам;
+        в памяти - только по top_authors авторов на группу.
+        """
+        posts = Post.objects.filter(group__isnull=False).order_by()
+        rows = posts.values('group', 'author__username').annotate(
+            total=Count('pk')
+        ).order_by('group', '-total', 'author__username')
+        # В одной транзакции, чтобы пост между чтением и записью
+        # не потерял сдвиг даты из touch
+        with transaction.atomic():
+            last_dates = dict(posts.values('group').annotate(
+                last=Max('pub_date')
+            ).values_list('group', 'last'))
+            authors = {}
+            for row in rows.iterator(chunk_size=batch_size):
+                top = authors.setdefault(row['group'], [])
+                if len(top) < top_authors:
+                    top.append([row['author__username'], row['total']])
+            groups = list(Group.objects.values_list('pk', flat=True))
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                (
+                    cls(
+                        group_id=pk,
+                        last_post_date=last_dates.get(pk),
+                        top_authors=json.dumps(
+                            authors.get(pk, []), ensure_ascii=False
+                        ),
+                    )
+                    for pk in groups
+                ),
+                batch_size=batch_size
+            )
+        return len(groups)
+
+
+class Timeline(models.Model):
+    """
+    Лента подписок, материализованная при записи.
+
+    Новый пост раскладывается по лентам подписчиков автора,
+    поэтому follow_index читает одну таблицу по индексу user.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # копия Post.pub_date, чтобы сортировать внутри индекса
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_post'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date']),
+        ]
+
+    @classmethod
+    def fan_out(cls, post, batch_size=1000):
+        """
+        Добавляет пост в ленты всех подписчиков автора. Подписчики
+        читаются потоком; после каждой пачки их ленты обрезаются
+        одним DELETE, поэтому лента не растёт между запусками
+        trim_timelines.
+        """
+        followers = Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True).iterator(chunk_size=batch_size)
+        batch = list(islice(followers, batch_size))
+        while batch:
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=user_id, post=post, pub_date=post.pub_date)
+                    for user_id in batch
+                ],
+                ignore_conflicts=True
+            )
+            cls.trim_many(batch)
+            batch = list(islice(followers, batch_size))
+
+    @classmethod
+    def backfill(cls, user_id, author_id):
+        """Заполняет ленту последними постами нового автора."""
+        posts = Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date'
+        ).values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+        cls.objects.bulk_create(
+            [
+                cls(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for pk, pub_date in posts
+            ],
+            ignore_conflicts=True
+        )
+        cls.trim(user_id)
+
+    @classmethod
+    def prune(cls, user_id, author_id):
+        """Убирает из ленты посты автора, от которого отписались."""
+        cls.objects.filter(
+            user_id=user_id, post__author_id=author_id
+        ).delete()
+
+    @classmethod
+    def trim(cls, user_id):
+        """Оставляет в ленте не больше TIMELINE_LENGTH новых записей."""
+        oldest_kept = cls.objects.filter(user_id=user_id).order_by(
+            '-pub_date'
+        ).values_list('pub_date', flat=True)[
+            settings.TIMELINE_LENGTH - 1:settings.TIMELINE_LENGTH
+        ]
+        cls.objects.filter(
+            user_id=user_id, pub_date__lt=models.Subquery(oldest_kept)
+        ).delete()
+
+    @classmethod
+    def trim_many(cls, user_ids):
+        """trim для пачки лент одним DELETE с подзапросом на ленту."""
+        oldest_kept = cls.objects.filter(
+            user_id=models.OuterRef('user_id')
+        ).order_by('-pub_date').values('pub_date')[
+            settings.TIMELINE_LENGTH - 1:settings.TIMELINE_LENGTH
+        ]
+        cls.objects.filter(
+            user_id__in=user_ids, pub_date__lt=models.Subquery(oldest_kept)
+        ).delete()
+
+
+class HotPost(models.Model):
+    """
+    Рейтинг поста для ленты "Популярное", который обновляется
+    по событиям, а не пересчитывается при чтении.
+
+    rank - двоичный логарифм суммы весов событий, умноженных на
+    2 ** ((время события - эпоха) / HOT_HALF_LIFE). Затухание у всех
+    постов общее, поэтому порядок по rank - это порядок по текущему
+    затухающему счёту, и старые строки пересчитывать не нужно.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='hot'
+    )
+    rank = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rank']),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.rank}'
+
+    @classmethod
+    def trim(cls):
+        """Оставляет в таблице HOT_POSTS постов с лучшим рейтингом."""
+        lowest_kept = cls.objects.order_by('-rank').values_list(
+            'rank', flat=True
+        )[settings.HOT_POSTS - 1:settings.HOT_POSTS]
+        cls.objects.filter(rank__lt=models.Subquery(lowest_kept)).delete()
+
+
+class FollowSuggestion(models.Model):
+    """
+    Рекомендация автора для подписки, посчитанная offline
+    командой suggest_follows; на странице читается одним запросом.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow_suggestion'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score']),
+        ]
+
+    @classmethod
+    def for_user(cls, user, limit):
+        """Лучшие рекомендации без авторов, на которых уже подписан."""
+        return cls.objects.filter(user=user).exclude(
+            author__in=Follow.objects.filter(user=user).values('author')
+        ).select_related('author').order_by('-score', 'author_id')[:limit]
+
+
+class Notification(models.Model):
+    """
+    Уведомление в приложении: комментарий к посту получателя или
+    новый пост автора из его подписок. Создаются пачками в задачах,
+    письма-дайджесты по ним рассылает команда send_digests.
+    """
+    COMMENT = 'comment'
+    POST = 'post'
+    KINDS = [
+        (COMMENT, 'Новый комментарий'),
+        (POST, 'Новый пост'),
+    ]
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # кто прокомментировал или опубликовал пост
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    read = models.BooleanField(default=False)
+    emailed = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-created']),
+            # ещё не разосланные письмом - по получателям для дайджеста
+            models.Index(fields=['emailed', 'recipient']),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.get_kind_display()}'
+
+
+class PostTerm(models.Model):
+    """
+    Запасной инвертированный индекс для поиска по постам,
+    когда SQLite собран без FTS5: слово -> пост и число вхождений.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='terms'
+    )
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_post_term'
+            )
+        ]
@@ -0,0 +1,139 @@
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+
+from .models import Post, PostTerm
+
+FTS_TABLE = 'posts_post_fts'
+FTS_CREATE = f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(text)'
+TERM_LENGTH = PostTerm._meta.get_field('term').max_length
+
+
+def tokenize(text):
+    return [
+        word[:TERM_LENGTH] for word in re.findall(r'\w+', text.lower())
+    ]
+
+
+def fts5_available():
+    """SQLite собран с FTS5 (проверка создаёт временную таблицу)."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(text)'
+            )
+        except Exception:
+            return False
+        cursor.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+
+def backend():
+    """'fts5' или 'python' - чистый инвертированный индекс PostTerm."""
+    if settings.SEARCH_BACKEND != 'auto':
+        return settings.SEARCH_BACKEND
+    if not hasattr(connection, '_search_backend'):
+        connection._search_backend = (
+            'fts5' if fts5_available() else 'python'
+        )
+    return connection._search_backend
+
+
+def index_post(post):
+    """Обновляет запись поста в индексе после создания или правки."""
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text]
+            )
+        return
+    PostTerm.objects.filter(post_id=post.pk).delete()
+    PostTerm.objects.bulk_create(
+        PostTerm(post_id=post.pk, term=term, count=count)
+        for term, count in Counter(tokenize(post.text)).items()
+    )
+
+
+def remove_post(post_id):
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+    # Строки PostTerm удаляются каскадом вместе с постом
+
+
+def rebuild(batch_size=1000):
+    """Строит индекс заново по всем постам, пачками."""
+    posts = Post.objects.order_by().values_list('pk', 'text')
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(FTS_CREATE)
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            batch = []
+            for row in posts.iterator():
+                batch.append(row)
+                if len(batch) == batch_size:
+                    _insert_fts(cursor, batch)
+                    batch = []
+            _insert_fts(cursor, batch)
+        return
+    PostTerm.objects.all().delete()
+    PostTerm.objects.bulk_create(
+        (
+            PostTerm(post_id=pk, term=term, count=count)
+            for pk, text in posts.iterator()
+            for term, count in Counter(tokenize(text)).items()
+        ),
+        batch_size=batch_size
+    )
+
+
+def _insert_fts(cursor, rows):
+    cursor.executemany(
+        f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', rows
+    )
+
+
+def search(query, posts=None):
+    """
+    Посты, содержащие все слова запроса, от самых релевантных.
+
+    FTS5 ранжирует по bm25, запасной индекс - по числу вхождений.
+    """
+    posts = Post.objects.feed() if posts is None else posts
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return posts.none()
+    if backend() == 'fts5':
+        match = ' '.join(f'"{term}"' for term in terms)
+        # Соединение с виртуальной таблицей: ORM не умеет MATCH
+        return posts.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = posts_post.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[match],
+            select={'rank': f'bm25({FTS_TABLE})'},
+        ).order_by('rank', '-pub_date')
+    matched = PostTerm.objects.filter(term__in=terms).order_by().values(
+        'post'
+    ).annotate(matched=Count('pk')).filter(matched=len(terms))
+    scores = PostTerm.objects.filter(
+        term__in=terms, post=OuterRef('pk')
+    ).order_by().values('post').annotate(score=Sum('count'))
+    return posts.filter(
+        pk__in=matched.values('post')
+    ).annotate(
+        score=Subquery(scores.values('score'), output_field=IntegerField())
+    ).order_by('-score', '-pub_date')
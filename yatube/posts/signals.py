@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import tasks, thumbnails
+from .caching import invalidate_feeds
+from .models import Comment, Follow, Group, GroupStats, Post, UserStats
+
+
+# post_delete вызывается внутри транзакции удаления, в том числе
+# при каскадном удалении и QuerySet.delete()
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.decrement(instance.author_id)
+    Group.change_post_count(instance.group_id, -1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, raw=False, **kwargs):
+    # После коммита: запрос ленты между сбросом и коммитом иначе
+    # сохранил бы старый список id под новой версией лент
+    if not raw:
+        transaction.on_commit(invalidate_feeds)
+
+
+# Поиск, ленты подписок и превью обновляются вне ответа: задачи
+# core.tasks ставятся в той же транзакции, что и изменение
+@receiver(post_save, sender=Post)
+def post_saved_to_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        tasks.index_post.delay(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_from_search(sender, instance, **kwargs):
+    tasks.index_post.delay(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, raw=False, **kwargs):
+    # Превью создаются сразу после загрузки, а не при первом просмотре
+    if instance.image and not raw:
+        name = instance.image.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        tasks.fan_out_post.delay(instance.pk)
+        tasks.notify_followers.delay(instance.pk)
+        tasks.hot_post_created.delay(
+            instance.pk, instance.pub_date.timestamp()
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved_to_group_stats(sender, instance, raw=False, **kwargs):
+    # Дата последнего поста - одним UPDATE, авторов пересчитывает
+    # refresh_group_stats
+    if instance.group_id and not raw:
+        GroupStats.touch(instance.group_id, instance.pub_date)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        tasks.notify_comment.delay(instance.pk)
+        tasks.hot_post_commented.delay(
+            instance.post_id, instance.pub_date.timestamp()
+        )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        tasks.backfill_timeline.delay(instance.user_id, instance.author_id)
+        tasks.hot_author_followed.delay(
+            instance.author_id, timezone.now().timestamp()
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    tasks.prune_timeline.delay(instance.user_id, instance.author_id)
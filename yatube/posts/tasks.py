@@ -0,0 +1,113 @@
+from core.tasks import task
+from . import hot, search
+from .models import (
+    Comment, Follow, HotPost, Notification, Post, Timeline
+)
+from .transfer import batched
+
+# Сколько уведомлений подписчикам пишется одним bulk_create
+NOTIFY_BATCH = 1000
+
+
+@task()
+def index_post(post_id):
+    """Обновляет пост в поисковом индексе, удалённый - убирает."""
+    post = Post.objects.filter(pk=post_id).only('text').first()
+    if post is None:
+        search.remove_post(post_id)
+    else:
+        search.index_post(post)
+
+
+@task()
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'author_id', 'pub_date'
+    ).first()
+    if post is not None:
+        Timeline.fan_out(post)
+
+
+# Пока задача ждала, подписку могли уже отменить или вернуть,
+# поэтому лента сверяется с текущим состоянием подписки
+@task()
+def backfill_timeline(user_id, author_id):
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        Timeline.backfill(user_id, author_id)
+
+
+@task()
+def prune_timeline(user_id, author_id):
+    if not Follow.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).exists():
+        Timeline.prune(user_id, author_id)
+
+
+@task()
+def notify_followers(post_id):
+    """
+    Уведомляет подписчиков автора о новом посте. Подписчики читаются
+    потоком, уведомления пишутся пачками по NOTIFY_BATCH.
+    """
+    post = Post.objects.filter(pk=post_id).only('author_id').first()
+    if post is None:
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    for batch in batched(followers.iterator(chunk_size=NOTIFY_BATCH),
+                         NOTIFY_BATCH):
+        Notification.objects.bulk_create(
+            Notification(
+                recipient_id=user_id, kind=Notification.POST,
+                actor_id=post.author_id, post_id=post_id,
+            )
+            for user_id in batch
+        )
+
+
+@task()
+def notify_comment(comment_id):
+    """Уведомляет автора поста о комментарии, кроме его собственных."""
+    comment = Comment.objects.filter(pk=comment_id).values(
+        'author_id', 'post_id', 'post__author_id'
+    ).first()
+    if comment is None or comment['author_id'] == comment['post__author_id']:
+        return
+    Notification.objects.create(
+        recipient_id=comment['post__author_id'], kind=Notification.COMMENT,
+        actor_id=comment['author_id'], post_id=comment['post_id'],
+        comment_id=comment_id,
+    )
+
+
+# События рейтинга "Популярное"; timestamp - время события, а не
+# запуска задачи, чтобы задержка очереди не завышала рейтинг.
+# Любое событие может вернуть в таблицу обрезанный пост, поэтому
+# после добавления строки таблица обрезается до HOT_POSTS
+@task()
+def hot_post_created(post_id, timestamp):
+    if (Post.objects.filter(pk=post_id).exists()
+            and hot.bump(post_id, hot.POST_WEIGHT, timestamp)):
+        HotPost.trim()
+
+
+@task()
+def hot_post_commented(post_id, timestamp):
+    if (Post.objects.filter(pk=post_id).exists()
+            and hot.bump(post_id, hot.COMMENT_WEIGHT, timestamp)):
+        HotPost.trim()
+
+
+@task()
+def hot_author_followed(author_id, timestamp):
+    """Подписка поднимает посты автора, которые уже в рейтинге."""
+    posts = list(HotPost.objects.filter(
+        post__author_id=author_id
+    ).values_list('post_id', flat=True))
+    inserted = [
+        hot.bump(post_id, hot.FOLLOW_WEIGHT, timestamp) for post_id in posts
+    ]
+    if any(inserted):
+        HotPost.trim()
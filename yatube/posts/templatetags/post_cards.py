@@ -0,0 +1,62 @@
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from ..thumbnails import ready_thumbnail
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+# Карточка не зависит от пользователя и меняется вместе с постом
+CARD_TIMEOUT = 3600
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, group_link=True):
+    """
+    Карточка поста для лент.
+
+    Ссылки, превью и подписи готовятся здесь, в Python, а готовый
+    HTML кэшируется по посту, поэтому шаблон карточки - только разметка.
+    """
+    thumbnail = ready_thumbnail(post.image, 'card')
+    # Имя автора и группа тоже в ключе: их переименование не меняет
+    # пост, но меняет карточку
+    group = post.group if group_link else None
+    key = make_template_fragment_key('post_card', [
+        post.pk, post.updated, post.comment_count,
+        thumbnail and thumbnail.name, group_link,
+        post.author.username, post.author.get_full_name(),
+        group and group.slug, group and group.title,
+    ])
+    html = cache.get(key)
+    if html is None:
+        html = render_card(context, post, thumbnail, group)
+        cache.set(key, html, CARD_TIMEOUT)
+    return mark_safe(html)
+
+
+def render_card(context, post, thumbnail, group):
+    if thumbnail:
+        image_url = thumbnail.url
+    elif post.image:
+        image_url = static('img/thumbnail_placeholder.svg')
+    else:
+        image_url = None
+    card = {
+        'post': post,
+        'author_name': post.author.get_full_name(),
+        'profile_url': reverse('posts:profile', args=[post.author.username]),
+        'detail_url': reverse('posts:post_detail', args=[post.pk]),
+        'group_url': group and reverse('posts:group_list', args=[group.slug]),
+        'image_url': image_url,
+        'image_ready': bool(thumbnail),
+    }
+    # Тот же движок, что у страницы: с его загрузчиками и кэшем шаблонов
+    card_template = context.template.engine.get_template(CARD_TEMPLATE)
+    return card_template.render(template.Context(
+        card, autoescape=context.autoescape
+    ))
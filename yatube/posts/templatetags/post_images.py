@@ -0,0 +1,11 @@
+from django import template
+
+from ..thumbnails import ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, size='card'):
+    """Заранее созданное превью картинки поста или None, пока оно в работе."""
+    return ready_thumbnail(image, size)
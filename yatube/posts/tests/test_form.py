@@ -1,15 +1,24 @@
 import shutil
 import tempfile
+import tracemalloc
+from io import BytesIO
 
 from http import HTTPStatus
 
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Post, Group, Comment
+from ..uploads import (
+    COMPACT_SIDE, LimitedImageUploadHandler, RejectedUpload, compact_image,
+    image_size
+)
 
 User = get_user_model()
 
@@ -146,3 +155,118 @@ class PostCreateFormTests(TestCase):
                 pub_date__isnull=False,
                 text=form_data['text']).latest('pub_date')
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadLimitsTests(TestCase):
+    image_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def post_image(self, content):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с большой картинкой',
+                'image': SimpleUploadedFile(
+                    name='big.gif', content=content, content_type='image/gif'
+                ),
+            },
+        )
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_too_many_bytes_rejected(self):
+        """Файл больше POST_IMAGE_MAX_BYTES не сохраняется."""
+        response = self.post_image(self.image_gif + b'\x00' * 2048)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=1)
+    def test_too_large_dimensions_rejected(self):
+        """Размеры проверяются по заголовку картинки."""
+        response = self.post_image(self.image_gif)
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 1x1 пикселей.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024 * 1024)
+    def test_handler_memory_is_bounded(self):
+        """Обработчик не копит поток, превысивший лимит."""
+        handler = LimitedImageUploadHandler()
+        handler.new_file('image', 'big.gif', 'image/gif', None)
+        chunk = b'\x00' * handler.chunk_size
+        # Плагины Pillow загружаются один раз и не относятся к потоку
+        image_size(chunk)
+        tracemalloc.start()
+        passed = 0
+        for start in range(0, 8 * 1024 * 1024, handler.chunk_size):
+            if handler.receive_data_chunk(chunk, start) is not None:
+                passed += handler.chunk_size
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLessEqual(passed, 1024 * 1024)
+        self.assertLess(peak, 1024 * 1024)
+        self.assertIsInstance(handler.file_complete(passed), RejectedUpload)
+
+    def test_compact_image(self):
+        """
+        Большой JPEG уменьшается и становится прогрессивным; пост
+        переходит на новый файл, старый удаляется после этого.
+        """
+        output = BytesIO()
+        Image.effect_noise((COMPACT_SIDE * 2, 200), 64).convert('RGB').save(
+            output, 'JPEG', quality=95
+        )
+        name = default_storage.save(
+            'posts/noise.jpg', ContentFile(output.getvalue())
+        )
+        author = User.objects.create_user(username='compact')
+        post = Post.objects.create(text='Шум', author=author, image=name)
+        compacted_name = compact_image(name)
+        self.assertNotEqual(compacted_name, name)
+        self.assertFalse(default_storage.exists(name))
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, compacted_name)
+        with default_storage.open(compacted_name) as compacted:
+            image = Image.open(compacted)
+            self.assertEqual(image.size, (COMPACT_SIDE, 100))
+            self.assertTrue(image.info.get('progressive'))
+            self.assertLess(compacted.size, output.tell())
+
+    def test_compact_image_without_post(self):
+        """Файл без поста не трогается, пережатая копия не остаётся."""
+        output = BytesIO()
+        Image.effect_noise((COMPACT_SIDE * 2, 200), 64).convert('RGB').save(
+            output, 'JPEG', quality=95
+        )
+        name = default_storage.save(
+            'posts/orphan.jpg', ContentFile(output.getvalue())
+        )
+        self.assertEqual(compact_image(name), name)
+        self.assertEqual(
+            [file for file in default_storage.listdir('posts')[1]
+             if file.startswith('orphan')],
+            ['orphan.jpg']
+        )
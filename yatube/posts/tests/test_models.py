@@ -1,7 +1,29 @@
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models.signals import pre_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-from ..models import Group, Post
+from .. import hot
+from ..models import (
+    Comment, Follow, FollowSuggestion, Group, GroupStats, HotPost, Post,
+    Timeline, UserStats
+)
+from ..suggestions import Graph
+from ..transfer import Importer
+from ..views import GROUP_NUMBERS, POST_NUMBERS
 
 User = get_user_model()
 
@@ -58,3 +80,547 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='counter-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, user_posts, group_posts, other_group_posts):
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).post_count, user_posts
+        )
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.post_count, group_posts)
+        self.assertEqual(self.other_group.post_count, other_group_posts)
+
+    def test_post_counters(self):
+        """Счётчики постов меняются при создании, правке и удалении."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        Post.objects.create(author=self.user, text='Пост без группы')
+        self.assertCounters(2, 1, 0)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(2, 0, 1)
+        post.delete()
+        self.assertCounters(1, 0, 0)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев поста меняется при создании и удалении."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comments = [
+            Comment.objects.create(post=post, author=self.user, text='Ком')
+            for _ in range(3)
+        ]
+        comments[0].delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+
+    def test_recount_counters_command(self):
+        """Команда восстанавливает счётчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(5)
+        )
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text='Ком')
+            for _ in range(4)
+        )
+        call_command('recount_counters', stdout=open(os.devnull, 'w'))
+        self.assertCounters(5, 5, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 4)
+
+
+class UserStatsRaceTest(TransactionTestCase):
+    """Параллельная запись идёт через своё соединение и коммитится."""
+
+    def test_increment_after_parallel_create(self):
+        """Строку счётчика создали параллельно: прибавка не теряется."""
+        user = User.objects.create_user(username='race')
+
+        def create_row():
+            try:
+                UserStats.objects.create(user_id=user.pk, post_count=5)
+            finally:
+                connection.close()
+
+        def parallel_create(sender, **kwargs):
+            pre_save.disconnect(parallel_create, sender=UserStats)
+            thread = threading.Thread(target=create_row)
+            thread.start()
+            thread.join()
+
+        pre_save.connect(parallel_create, sender=UserStats)
+        self.addCleanup(
+            pre_save.disconnect, parallel_create, sender=UserStats
+        )
+        UserStats.increment(user.pk)
+        self.assertEqual(UserStats.objects.get(user=user).post_count, 6)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+
+    def timeline_posts(self):
+        return list(Post.objects.filter(timeline_entries__user=self.reader))
+
+    def test_fan_out_backfill_prune(self):
+        """Лента заполняется при подписке, новых постах и чистится."""
+        old_post = Post.objects.create(author=self.author, text='Старый')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline_posts(), [old_post])
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.timeline_posts(), [new_post, old_post])
+        follow.delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_trim(self):
+        """В ленте остаются только TIMELINE_LENGTH новых записей."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(5)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+        for post in posts:
+            Timeline.objects.get_or_create(
+                user=self.reader, post=post, pub_date=post.pub_date
+            )
+        Timeline.trim(self.reader.pk)
+        self.assertEqual(self.timeline_posts(), posts[:1:-1])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_fan_out_trims(self):
+        """Раскладка нового поста сразу обрезает ленты подписчиков."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(4)
+        ]
+        self.assertEqual(self.timeline_posts(), posts[:1:-1])
+        self.assertEqual(Timeline.objects.filter(user=other).count(), 2)
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        media = override_settings(
+            MEDIA_ROOT=os.path.join(self.directory, 'media')
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+        author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=author, group=group, text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', b'GIF89a\x01\x00\x01\x00\x00\x00\x00;',
+                content_type='image/gif'
+            )
+        )
+        # Дата из прошлого должна пережить загрузку
+        self.pub_date = timezone.now() - timedelta(days=3)
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.pub_date)
+        Comment.objects.create(post=self.post, author=reader, text='Ком')
+        Follow.objects.create(user=reader, author=author)
+
+    def round_trip(self, file_format):
+        export_dir = os.path.join(self.directory, file_format)
+        media_dir = os.path.join(self.directory, 'images')
+        call_command(
+            'export_posts', export_dir, format=file_format,
+            media_dir=media_dir, stdout=open(os.devnull, 'w')
+        )
+        image = self.post.image.name
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        default_storage.delete(image)
+        call_command(
+            'import_posts', export_dir, format=file_format,
+            media_dir=media_dir, stdout=open(os.devnull, 'w')
+        )
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка сохраняют данные, даты и производные."""
+        for file_format in ('jsonl', 'csv'):
+            with self.subTest(file_format=file_format):
+                self.round_trip(file_format)
+                post = Post.objects.select_related('author', 'group').get()
+                self.assertEqual(post.pk, self.post.pk)
+                self.assertEqual(post.text, 'Пост с картинкой')
+                self.assertEqual(post.pub_date, self.pub_date)
+                self.assertEqual(post.author.get_full_name(), 'Лев Толстой')
+                self.assertEqual(post.group.slug, 'group')
+                self.assertEqual(post.group.post_count, 1)
+                self.assertEqual(post.comment_count, 1)
+                self.assertEqual(post.author.stats.post_count, 1)
+                self.assertTrue(default_storage.exists(post.image.name))
+                self.assertTrue(HotPost.objects.filter(post=post))
+                comment = Comment.objects.get()
+                self.assertEqual(comment.author.username, 'reader')
+                reader = User.objects.get(username='reader')
+                self.assertFalse(reader.has_usable_password())
+                self.assertTrue(
+                    Follow.objects.filter(user=reader, author=post.author)
+                )
+                self.assertEqual(
+                    list(reader.timeline.values_list('post', flat=True)),
+                    [post.pk]
+                )
+
+    def test_new_rows_after_import(self):
+        """После загрузки с чужими id новые посты и комментарии создаются."""
+        self.round_trip('jsonl')
+        post = Post.objects.create(author=User.objects.get(
+            username='author'
+        ), text='Новый')
+        self.assertGreater(post.pk, self.post.pk)
+        Comment.objects.create(
+            post=post, author=post.author, text='Новый комментарий'
+        )
+
+    def test_rebuild_touches_only_imported(self):
+        """Ленты собираются только для авторов из загрузки."""
+        call_command(
+            'export_posts', self.directory, stdout=open(os.devnull, 'w')
+        )
+        Post.objects.all().delete()
+        # Подписка вне загрузки: её лента остаётся как есть
+        outsider = User.objects.create_user(username='outsider')
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Чужой')
+        Follow.objects.create(user=outsider, author=other)
+        Timeline.objects.filter(user=outsider).delete()
+        importer = Importer(self.directory, 'jsonl', 100)
+        for table in ('users', 'posts'):
+            importer.load(table)
+        self.assertEqual(importer.rebuild_timelines(), 1)
+        reader = User.objects.get(username='reader')
+        self.assertEqual(
+            list(reader.timeline.values_list('post', flat=True)),
+            [self.post.pk]
+        )
+        self.assertFalse(Timeline.objects.filter(user=outsider))
+
+    def test_unknown_author_aborts_import(self):
+        call_command(
+            'export_posts', self.directory, stdout=open(os.devnull, 'w')
+        )
+        os.remove(os.path.join(self.directory, 'users.jsonl'))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_posts', self.directory, stdout=open(os.devnull, 'w')
+            )
+        # Загрузка идёт одной транзакцией и откатывается целиком
+        self.assertFalse(Group.objects.exists())
+
+
+class FollowSuggestionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = ['reader', 'friend', 'popular', 'niche', 'critic', 'quiet']
+        cls.users = {
+            name: User.objects.create_user(username=name) for name in names
+        }
+        group = Group.objects.create(title='Группа', slug='group')
+        for name in ('friend', 'popular', 'niche', 'critic'):
+            Post.objects.create(text='Пост', author=cls.users[name])
+        Post.objects.create(
+            text='Пост', author=cls.users['reader'], group=group
+        )
+        Post.objects.create(
+            text='Пост', author=cls.users['niche'], group=group
+        )
+        follows = [
+            ('reader', 'friend'), ('friend', 'popular'), ('friend', 'niche'),
+            ('friend', 'quiet'), ('critic', 'popular'),
+        ]
+        for user, author in follows:
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+        post = Post.objects.filter(author=cls.users['friend']).get()
+        for name in ('reader', 'critic'):
+            Comment.objects.create(
+                text='Комментарий', author=cls.users[name], post=post
+            )
+
+    def suggested(self, name):
+        return [
+            User.objects.get(pk=author_id).username
+            for author_id, _ in Graph().suggest(self.users[name].pk, 10)
+        ]
+
+    def test_signals_combined(self):
+        # niche: через подписку и общую группу, popular - только через
+        # подписку; critic комментировал тот же пост; quiet без постов
+        self.assertEqual(
+            self.suggested('reader'), ['niche', 'popular', 'critic']
+        )
+
+    def test_command_stores_top_suggestions(self):
+        call_command('suggest_follows', limit=2, stdout=open(os.devnull, 'w'))
+        reader = self.users['reader']
+        self.assertEqual(
+            [s.author.username for s in FollowSuggestion.for_user(reader, 5)],
+            ['niche', 'popular']
+        )
+        # Подписка после расчёта сразу убирает автора из рекомендаций
+        Follow.objects.create(user=reader, author=self.users['niche'])
+        self.assertEqual(
+            [s.author.username for s in FollowSuggestion.for_user(reader, 5)],
+            ['popular']
+        )
+
+        self.client.force_login(reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Кого почитать')
+        self.assertContains(
+            response, reverse('posts:profile_follow', args=['popular'])
+        )
+
+    def test_rebuild_replaces_stale_rows(self):
+        quiet = self.users['quiet']
+        FollowSuggestion.objects.create(
+            user=quiet, author=self.users['friend'], score=1
+        )
+        call_command('suggest_follows', stdout=open(os.devnull, 'w'))
+        self.assertFalse(FollowSuggestion.objects.filter(user=quiet))
+        self.assertTrue(
+            FollowSuggestion.objects.filter(user=self.users['reader'])
+        )
+
+
+@override_settings(HOT_HALF_LIFE=3600)
+class HotPostTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def ranked(self):
+        return list(HotPost.objects.order_by('-rank').values_list(
+            'post__text', flat=True
+        ))
+
+    def test_rank_is_decayed_sum(self):
+        now = timezone.now().timestamp()
+        # Вес 2 час назад равен весу 1 сейчас
+        self.assertAlmostEqual(
+            hot.event_rank(2, now - 3600), hot.event_rank(1, now)
+        )
+        self.assertAlmostEqual(
+            hot.combine(hot.event_rank(1, now), hot.event_rank(1, now)),
+            hot.event_rank(2, now)
+        )
+        # Через годы от эпохи сумма не переполняется
+        self.assertAlmostEqual(hot.combine(50000.0, 1.0), 50000.0)
+
+    def test_comments_lift_post(self):
+        old = Post.objects.create(text='Старый', author=self.author)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - timedelta(hours=3)
+        )
+        HotPost.objects.filter(post=old).update(
+            rank=hot.event_rank(1, timezone.now().timestamp() - 3 * 3600)
+        )
+        Post.objects.create(text='Новый', author=self.author)
+        self.assertEqual(self.ranked(), ['Новый', 'Старый'])
+        for i in range(3):
+            Comment.objects.create(
+                post=old, author=self.reader, text=f'Комментарий {i}'
+            )
+        self.assertEqual(self.ranked(), ['Старый', 'Новый'])
+
+    def test_follow_lifts_author_posts(self):
+        other = User.objects.create_user(username='other')
+        Post.objects.create(text='Автор', author=self.author)
+        Post.objects.create(text='Другой', author=other)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.ranked(), ['Автор', 'Другой'])
+
+    @override_settings(HOT_POSTS=2)
+    def test_table_is_trimmed(self):
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(4)
+        ]
+        self.assertEqual(HotPost.objects.count(), 2)
+        # Комментарий возвращает обрезанный пост, и таблица снова
+        # обрезается до HOT_POSTS
+        Comment.objects.create(post=posts[0], author=self.reader, text='!')
+        self.assertEqual(HotPost.objects.count(), 2)
+
+    @override_settings(HOT_POSTS=2)
+    def test_rebuild(self):
+        """Пересчёт повторяет рейтинг событий и обрезает таблицу."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        Comment.objects.create(post=posts[0], author=self.reader, text='!')
+        # Пост старше глубины пересчёта в рейтинг не попадает
+        Post.objects.filter(pk=posts[2].pk).update(
+            pub_date=timezone.now() - timedelta(
+                seconds=settings.HOT_HALF_LIFE * (hot.REBUILD_HALF_LIVES + 1)
+            )
+        )
+        HotPost.objects.all().delete()
+        call_command('rebuild_hot_posts', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.ranked(), ['Пост 0', 'Пост 1'])
+
+    def test_popular_page(self):
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        Comment.objects.create(post=posts[0], author=self.reader, text='!')
+        response = self.client.get(reverse('posts:popular'))
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Пост 0', 'Пост 2', 'Пост 1']
+        )
+
+    def test_popular_keyset_pages(self):
+        """Популярное листается курсором по (rank, id)."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.author)
+            for i in range(POST_NUMBERS + 3)
+        )
+        # Равный rank у части постов: порядок добирается по id
+        HotPost.objects.bulk_create(
+            HotPost(post_id=pk, rank=float(pk // 2))
+            for pk in Post.objects.values_list('pk', flat=True)
+        )
+        expected = list(HotPost.objects.order_by(
+            '-rank', '-post_id'
+        ).values_list('post_id', flat=True))
+        url = reverse('posts:popular')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertFalse(second.has_next())
+        self.assertEqual([post.pk for post in [*first, *second]], expected)
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.empty = Group.objects.create(
+            title='Пустая', slug='empty', description='Описание'
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(4)
+        ]
+        for i, author in enumerate(cls.authors):
+            for _ in range(i + 1):
+                Post.objects.create(
+                    text='Пост', author=author, group=cls.group
+                )
+
+    def test_last_post_date_moves_on_create(self):
+        stats = GroupStats.objects.get(group=self.group)
+        self.assertEqual(
+            stats.last_post_date,
+            Post.objects.filter(group=self.group).latest('pub_date').pub_date
+        )
+        self.assertEqual(stats.authors, [])
+
+    def test_refresh(self):
+        out = StringIO()
+        call_command('refresh_group_stats', top=2, stdout=out)
+        self.assertIn('Групп: 2', out.getvalue())
+        stats = GroupStats.objects.get(group=self.group)
+        self.assertEqual(stats.authors, [
+            {'username': 'author3', 'post_count': 4},
+            {'username': 'author2', 'post_count': 3},
+        ])
+        empty = GroupStats.objects.get(group=self.empty)
+        self.assertIsNone(empty.last_post_date)
+
+    def test_directory_query_count_does_not_grow(self):
+        GroupStats.refresh(3)
+        url = reverse('posts:group_index')
+        # Одна страница с LEFT JOIN сводок, без COUNT(*)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(
+            [group.slug for group in response.context['page_obj']],
+            ['group', 'empty']
+        )
+        self.assertContains(response, 'author3')
+        Post.objects.create(
+            text='Ещё', author=self.authors[0], group=self.empty
+        )
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_directory_keyset_pages(self):
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i:02}', slug=f'g{i}', description='')
+            for i in range(GROUP_NUMBERS + 5)
+        )
+        expected = list(Group.objects.order_by(
+            '-post_count', 'title', 'pk'
+        ).values_list('slug', flat=True))
+        url = reverse('posts:group_index')
+        first = self.client.get(url).context['page_obj']
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            [group.slug for group in [*first, *second]], expected
+        )
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        broken = self.client.get(url, {'cursor': 'x'}).context['page_obj']
+        self.assertEqual(list(broken), list(first))
+
+    def test_group_page_shows_top_authors(self):
+        GroupStats.refresh(1)
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        self.assertContains(response, 'Активные авторы')
+        self.assertContains(response, 'author3')
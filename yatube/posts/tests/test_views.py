@@ -1,14 +1,28 @@
 import shutil
 import tempfile
+from datetime import timedelta
+from io import StringIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
 from django.core.cache import cache
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.db import connection, transaction
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Post, Group, Follow
+from core.paginator import CursorPaginator
+from ..caching import feed_version
+from ..models import (
+    Comment, Post, Group, GroupStats, Follow, Notification, Timeline
+)
+from ..thumbnails import ready_thumbnail
+from ..views import COMMENT_NUMBERS, POST_NUMBERS
 
 User = get_user_model()
 
@@ -184,6 +198,171 @@ class PaginatorViewsTest(TestCase):
         response = self.client.get(reverse('posts:index') + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages(self):
+        """Курсорная пагинация проходит ленту вперёд и назад."""
+        url = reverse('posts:index')
+        response = self.client.get(url + '?cursor=')
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        self.assertContains(response, first_page.next_cursor)
+
+        response = self.client.get(f'{url}?cursor={first_page.next_cursor}')
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(
+            list(first_page) + list(second_page), list(Post.objects.all())
+        )
+
+        response = self.client.get(
+            f'{url}?cursor={second_page.previous_cursor}'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page)
+        )
+
+    def test_cursor_page_single_query(self):
+        """Страница курсора не делает COUNT(*) и OFFSET."""
+        posts = Post.objects.all()
+        first_page = CursorPaginator(posts, 10).get_page(None)
+        with self.assertNumQueries(1):
+            page = CursorPaginator(posts, 10).get_page(
+                first_page.next_cursor
+            )
+            self.assertEqual(len(page), 3)
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=xyz')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {i}', author=cls.user, post=cls.post)
+            for i in range(COMMENT_NUMBERS + 5)
+        )
+
+    def test_post_detail_renders_first_batch(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENT_NUMBERS)
+        self.assertEqual(
+            list(comments),
+            list(Comment.objects.order_by('-pub_date', '-pk'))[
+                :COMMENT_NUMBERS
+            ]
+        )
+        self.assertContains(response, comments.next_cursor)
+
+    def test_fragment_returns_next_batch(self):
+        for order in ('new', 'old'):
+            with self.subTest(order=order):
+                url = reverse('posts:post_comments', args=[self.post.pk])
+                first = self.client.get(f'{url}?order={order}')
+                cursor = first.context['comments'].next_cursor
+                response = self.client.get(
+                    f'{url}?order={order}&cursor={cursor}'
+                )
+                self.assertTemplateUsed(
+                    response, 'includes/comment_list.html'
+                )
+                rest = response.context['comments']
+                self.assertEqual(len(rest), 5)
+                self.assertFalse(rest.has_next())
+                texts = [
+                    comment.text
+                    for comment in list(first.context['comments']) + list(rest)
+                ]
+                expected = [
+                    f'Комментарий {i}' for i in range(COMMENT_NUMBERS + 5)
+                ]
+                if order == 'new':
+                    expected.reverse()
+                self.assertEqual(texts, expected)
+
+    def test_fragment_queries(self):
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        # Пост и одна выборка комментариев с авторами
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_fragment_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class PostCardTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='card', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='card-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Текст карточки', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_card_links(self):
+        response = self.client.get(reverse('posts:index'))
+        for text in (
+            'Лев Толстой',
+            'Текст карточки',
+            reverse('posts:profile', args=['card']),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:group_list', args=['card-slug']),
+        ):
+            with self.subTest(text=text):
+                self.assertContains(response, text)
+        response = self.client.get(
+            reverse('posts:group_list', args=['card-slug'])
+        )
+        self.assertContains(response, 'Текст карточки')
+        self.assertNotContains(response, 'все записи группы')
+
+    def test_card_rendered_once(self):
+        """Готовая карточка берётся из кэша, пока пост не изменился."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertTemplateUsed(response, 'posts/includes/post_card.html')
+        response = self.client.get(reverse('posts:profile', args=['card']))
+        self.assertTemplateNotUsed(
+            response, 'posts/includes/post_card.html'
+        )
+        self.assertContains(response, 'Текст карточки')
+        Post.objects.get(pk=self.post.pk).save()
+        response = self.client.get(reverse('posts:profile', args=['card']))
+        self.assertTemplateUsed(response, 'posts/includes/post_card.html')
+
+    def test_card_follows_author_and_group(self):
+        """Переименование автора или группы не оставляет старую карточку."""
+        self.client.get(reverse('posts:index'))
+        User.objects.filter(pk=self.user.pk).update(first_name='Алексей')
+        Group.objects.filter(pk=self.group.pk).update(
+            title='Новое имя', slug='new-slug'
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Алексей Толстой')
+        self.assertContains(
+            response, reverse('posts:group_list', args=['new-slug'])
+        )
+
 
 class CacheTest(TestCase):
     @classmethod
@@ -214,6 +393,107 @@ class CacheTest(TestCase):
         posts = response.context['page_obj'].object_list
         self.assertEqual(len(posts), posts_count)
 
+    def test_index_page_ids_cached(self):
+        """Повторный запрос главной читает посты только по id из кэша."""
+        Post.objects.create(text='test_text', author=CacheTest.user)
+        index_url = reverse('posts:index')
+        self.client.get(index_url)
+        with self.assertNumQueries(1):
+            response = self.client.get(index_url)
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+
+class FeedInvalidationTest(TransactionTestCase):
+    # Версия лент меняется в on_commit, который TestCase не вызывает
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth3')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_index_cache_invalidated(self):
+        """Новые и удалённые посты сразу видны на главной."""
+        index_url = reverse('posts:index')
+        self.authorized_client.get(index_url)
+        post = Post.objects.create(text='test_text', author=self.user)
+        response = self.authorized_client.get(index_url)
+        self.assertIn(post, response.context['page_obj'].object_list)
+        post.delete()
+        response = self.client.get(index_url)
+        self.assertNotContains(response, 'test_text')
+
+    def test_feeds_invalidated_after_commit(self):
+        """Версия лент меняется только после коммита транзакции."""
+        version = feed_version()
+        with transaction.atomic():
+            Post.objects.create(text='test_text', author=self.user)
+            self.assertEqual(feed_version(), version)
+        self.assertNotEqual(feed_version(), version)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='conditional')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='conditional-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.user, group=cls.group
+        )
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.user.username]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_not_modified(self):
+        """Повторный запрос с тем же ETag получает 304 без шаблона."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertFalse(response.templates)
+
+    def test_changes_invalidate_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Comment.objects.create(text='Новый', author=self.user, post=self.post)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_group_stats_invalidate_etag(self):
+        """Исправленная пересчётом дата последнего поста меняет ETag."""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        etag = self.client.get(url)['ETag']
+        GroupStats.objects.filter(group=self.group).update(
+            last_post_date=self.post.pub_date - timedelta(days=1)
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('private', response['Cache-Control'])
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -261,6 +541,8 @@ class FollowTest(TestCase):
                 author=follower_user
             ).exists()
         )
+        response = self.authorized_client.get(follower_user_profile_url)
+        self.assertTrue(response.context['following'])
         response = self.authorized_client.get(profile_unfollow_url)
         self.assertRedirects(response, follower_user_profile_url)
         self.assertFalse(
@@ -269,6 +551,8 @@ class FollowTest(TestCase):
                 author=follower_user
             ).exists()
         )
+        response = self.authorized_client.get(follower_user_profile_url)
+        self.assertFalse(response.context['following'])
 
     def test_post_list_on_subscriber(self):
         """
@@ -293,3 +577,261 @@ class FollowTest(TestCase):
         self.assertNotIn(
             follower_post, response.context.get('page_obj').object_list
         )
+
+
+class NotificationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='writer', email='writer@example.com'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com'
+        )
+        cls.silent = User.objects.create_user(username='silent')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.silent, author=cls.author)
+
+    def test_post_and_comment_notifications(self):
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            set(Notification.objects.values_list(
+                'recipient__username', 'kind', 'actor__username'
+            )),
+            {('reader', 'post', 'writer'), ('silent', 'post', 'writer')}
+        )
+        Notification.objects.all().delete()
+        Comment.objects.create(post=post, author=self.author, text='Свой')
+        self.assertFalse(Notification.objects.exists())
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Чужой'
+        )
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.author)
+        self.assertEqual(notification.kind, Notification.COMMENT)
+        self.assertEqual(notification.comment, comment)
+
+    def test_page_marks_shown_as_read(self):
+        Post.objects.create(text='Новый пост', author=self.author)
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:notifications'))
+        items = list(response.context['page_obj'])
+        self.assertEqual(len(items), 1)
+        self.assertFalse(items[0].read)
+        self.assertContains(response, 'Новый пост')
+        self.assertFalse(
+            self.reader.notifications.filter(read=False).exists()
+        )
+        response = Client().get(reverse('posts:notifications'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_digest_one_email_per_user(self):
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        out = StringIO()
+        # На пачку получателей: их id, уведомления и UPDATE; в конце
+        # пустая пачка. От числа уведомлений не зависит
+        with self.assertNumQueries(7):
+            call_command('send_digests', batch_size=1, stdout=out)
+        # silent без email: отмечен, но письма нет
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+        self.assertEqual(mail.outbox[0].body.count('опубликовал'), 3)
+        self.assertIn('(3)', mail.outbox[0].subject)
+        self.assertFalse(Notification.objects.filter(emailed=False))
+        call_command('send_digests', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_digest_skips_read(self):
+        Post.objects.create(text='Пост', author=self.author)
+        Notification.objects.update(read=True)
+        call_command('send_digests', stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(Notification.objects.filter(emailed=False))
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='feed-slug',
+            description='Тестовое описание',
+        )
+        cls.author = User.objects.create_user(username='writer')
+        authors = [
+            cls.author,
+            User.objects.create_user(username='writer2'),
+        ]
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+        for i in range(POST_NUMBERS):
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=authors[i % 2],
+                group=cls.group,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        """Ленты не делают запросов на каждый пост страницы."""
+        # Сессия и пользователь дают 2 запроса авторизованному клиенту
+        feeds = {
+            reverse('posts:index'): 2 + 2,
+            reverse('posts:group_list', kwargs={'group_slug': 'feed-slug'}): (
+                2 + 3
+            ),
+            # плюс проверка подписки на автора
+            reverse('posts:profile', kwargs={'username': 'writer'}): 2 + 4,
+            # и ещё один на готовые рекомендации авторов
+            reverse('posts:follow_index'): 2 + 3,
+        }
+        for url, queries in feeds.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = self.authorized_client.get(url)
+                self.assertTrue(response.context['page_obj'])
+
+    def test_feed_query_plans(self):
+        """Страницы лент и комментариев читаются по индексу без сортировки."""
+        post = Post.objects.first()
+        Comment.objects.create(text='Комментарий', author=self.user, post=post)
+        post_indexes = {
+            tuple(index.fields): index.name for index in Post._meta.indexes
+        }
+        pages = {
+            reverse('posts:index'): ('posts_post', 'posts_post_pub_date'),
+            reverse('posts:group_list', kwargs={'group_slug': 'feed-slug'}): (
+                'posts_post', post_indexes[('group', '-pub_date')]
+            ),
+            reverse('posts:profile', kwargs={'username': 'writer'}): (
+                'posts_post', post_indexes[('author', '-pub_date')]
+            ),
+            reverse('posts:follow_index'): (
+                'posts_timeline', Timeline._meta.indexes[0].name
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}): (
+                'posts_comment', Comment._meta.indexes[0].name
+            ),
+        }
+        for url, (table, index) in pages.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.authorized_client.get(url)
+                sql = next(
+                    query['sql'] for query in queries
+                    if f'FROM "{table}"' in query['sql']
+                    or f'JOIN "{table}"' in query['sql']
+                    if 'ORDER BY' in query['sql']
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn(f'{table} USING INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока превью не готово, в ленте заглушка, затем - превью."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.client.get(url)
+        self.assertContains(response, 'thumbnail_placeholder.svg')
+        # При THUMBNAIL_WORKERS=0 превью создано прямо во время запроса
+        thumbnail = ready_thumbnail(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(url)
+        self.assertContains(response, thumbnail.url)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tolstoy')
+        cls.war = Post.objects.create(
+            author=cls.user, text='Война и мир: война, мир и снова война'
+        )
+        cls.peace = Post.objects.create(
+            author=cls.user, text='Мир и война'
+        )
+        cls.other = Post.objects.create(author=cls.user, text='Анна Каренина')
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_ranked_results(self):
+        """Найдены посты со всеми словами, самые релевантные первыми."""
+        self.assertEqual(self.search('ВОЙНА мир'), [self.war, self.peace])
+        self.assertEqual(self.search('каренина'), [self.other])
+        self.assertEqual(self.search(''), [])
+
+    def test_index_follows_edit_and_delete(self):
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Воскресение'
+        post.save()
+        self.assertEqual(self.search('каренина'), [])
+        self.assertEqual(self.search('воскресение'), [post])
+        post.delete()
+        self.assertEqual(self.search('воскресение'), [])
+
+    def test_pagination_keeps_query(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text='война') for _ in range(POST_NUMBERS)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'война'})
+        self.assertContains(
+            response, '?q=%D0%B2%D0%BE%D0%B9%D0%BD%D0%B0&amp;page=2'
+        )
+
+    def test_api(self):
+        response = self.client.get(
+            reverse('posts:search_api'), {'q': 'анна'}
+        )
+        results = response.json()['results']
+        self.assertEqual([post['id'] for post in results], [self.other.pk])
+        self.assertEqual(results[0]['author'], 'tolstoy')
+
+
+@override_settings(SEARCH_BACKEND='python')
+class PythonSearchTest(SearchTest):
+    """Тот же поиск на запасном инвертированном индексе PostTerm."""
@@ -0,0 +1,97 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .uploads import compact_image
+
+logger = logging.getLogger(__name__)
+
+# Все размеры превью, которые выводят шаблоны постов
+GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Как get_thumbnail, но только читает kvstore и ничего не создаёт."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def find_thumbnail(image, size):
+    """Готовое превью или None, ничего не ставя в очередь."""
+    if not image:
+        return None
+    geometry, options = GEOMETRIES[size]
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def ready_thumbnail(image, size):
+    """Готовое превью или None; отсутствующее ставится в очередь."""
+    thumbnail = find_thumbnail(image, size)
+    if thumbnail is None and image:
+        schedule(image.name)
+    return thumbnail
+
+
+def schedule(name):
+    """Пережимает картинку и создаёт все превью в фоновом пуле потоков."""
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    _get_executor().submit(generate, name)
+
+
+def generate(name):
+    try:
+        name = compact_image(name)
+        for geometry, options in GEOMETRIES.values():
+            default.backend.get_thumbnail(name, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать превью для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        if settings.THUMBNAIL_WORKERS:
+            # Поток пула держит своё соединение с БД для kvstore
+            connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
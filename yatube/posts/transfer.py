@@ -0,0 +1,344 @@
+import csv
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Follow, Group, Post, Timeline
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+
+# Таблицы выгрузки в порядке загрузки: ссылки идут на уже загруженное.
+# Пользователи и группы связываются по username и slug, посты - по id
+TABLES = {
+    'users': (
+        ('username', 'first_name', 'last_name'),
+        lambda: User.objects.order_by('pk').values_list(
+            'username', 'first_name', 'last_name'
+        ),
+    ),
+    'groups': (
+        ('slug', 'title', 'description'),
+        lambda: Group.objects.order_by('pk').values_list(
+            'slug', 'title', 'description'
+        ),
+    ),
+    'posts': (
+        ('id', 'text', 'pub_date', 'updated', 'author', 'group', 'image'),
+        lambda: Post.objects.order_by('pk').values_list(
+            'pk', 'text', 'pub_date', 'updated', 'author__username',
+            'group__slug', 'image'
+        ),
+    ),
+    'comments': (
+        ('id', 'post', 'author', 'text', 'pub_date'),
+        lambda: Comment.objects.order_by('pk').values_list(
+            'pk', 'post_id', 'author__username', 'text', 'pub_date'
+        ),
+    ),
+    'follows': (
+        ('user', 'author'),
+        lambda: Follow.objects.order_by('pk').values_list(
+            'user__username', 'author__username'
+        ),
+    ),
+}
+
+
+def table_path(directory, table, file_format):
+    return os.path.join(directory, f'{table}.{file_format}')
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def write_rows(path, file_format, fields, rows):
+    """Пишет строки values_list() в файл по одной, возвращает их число."""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as output:
+        if file_format == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(fields)
+        for row in rows:
+            row = [plain(value) for value in row]
+            if file_format == 'csv':
+                writer.writerow(['' if value is None else value
+                                 for value in row])
+            else:
+                output.write(json.dumps(
+                    dict(zip(fields, row)), ensure_ascii=False
+                ))
+                output.write('\n')
+            count += 1
+    return count
+
+
+def read_rows(path, file_format):
+    """Ленивый поток словарей из файла выгрузки."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_table(directory, table, file_format, batch_size):
+    fields, queryset = TABLES[table]
+    return write_rows(
+        table_path(directory, table, file_format), file_format, fields,
+        queryset().iterator(chunk_size=batch_size)
+    )
+
+
+def export_images(media_dir, batch_size):
+    """Копирует файлы картинок постов в media_dir под теми же именами."""
+    images = Post.objects.exclude(image='').values_list('image', flat=True)
+    copied = 0
+    for name in images.iterator(chunk_size=batch_size):
+        target = os.path.join(media_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with default_storage.open(name) as source, \
+                open(target, 'wb') as output:
+            shutil.copyfileobj(source, output)
+        copied += 1
+    return copied
+
+
+@contextmanager
+def keep_dates(*models):
+    """
+    Отключает auto_now и auto_now_add, чтобы загрузка сохранила даты
+    из выгрузки: bulk_create иначе подставит текущее время.
+    """
+    fields = [
+        field for model in models for field in model._meta.fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+class Importer:
+    """
+    Потоковая загрузка выгрузки пачками bulk_create.
+
+    В памяти держатся только пачка строк и словари username -> id
+    и slug -> id, поэтому память не растёт с числом постов.
+    """
+
+    def __init__(self, directory, file_format, batch_size, media_dir=None):
+        self.directory = directory
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.media_dir = media_dir
+        self.user_ids = {}
+        self.group_ids = {}
+        # Авторы, чьи посты или подписчики пришли с загрузкой:
+        # только их посты раскладываются по лентам после неё
+        self.new_authors = set()
+
+    def rows(self, table):
+        path = table_path(self.directory, table, self.file_format)
+        if not os.path.exists(path):
+            return None
+        return read_rows(path, self.file_format)
+
+    def load(self, table):
+        """Загружает таблицу, если её файл есть; возвращает число строк."""
+        rows = self.rows(table)
+        if rows is None:
+            return None
+        return getattr(self, f'load_{table}')(rows)
+
+    def user_id(self, username):
+        try:
+            return self.user_ids[username]
+        except KeyError:
+            raise ValueError(f'Неизвестный пользователь: {username}')
+
+    def group_id(self, slug):
+        if not slug:
+            return None
+        try:
+            return self.group_ids[slug]
+        except KeyError:
+            raise ValueError(f'Неизвестная группа: {slug}')
+
+    def load_users(self, rows):
+        self.user_ids = dict(User.objects.values_list('username', 'pk'))
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            User.objects.bulk_create(
+                User(
+                    username=row['username'],
+                    first_name=row['first_name'] or '',
+                    last_name=row['last_name'] or '',
+                    password=make_password(None),
+                )
+                for row in batch if row['username'] not in self.user_ids
+            )
+            count += len(batch)
+        self.user_ids = dict(User.objects.values_list('username', 'pk'))
+        return count
+
+    def load_groups(self, rows):
+        existing = set(Group.objects.values_list('slug', flat=True))
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            Group.objects.bulk_create(
+                Group(
+                    slug=row['slug'],
+                    title=row['title'],
+                    description=row['description'] or '',
+                )
+                for row in batch if row['slug'] not in existing
+            )
+            count += len(batch)
+        self.group_ids = dict(Group.objects.values_list('slug', 'pk'))
+        return count
+
+    def load_posts(self, rows):
+        if not self.user_ids:
+            self.user_ids = dict(User.objects.values_list('username', 'pk'))
+        if not self.group_ids:
+            self.group_ids = dict(Group.objects.values_list('slug', 'pk'))
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            posts = []
+            for row in batch:
+                author_id = self.user_id(row['author'])
+                self.new_authors.add(author_id)
+                posts.append(Post(
+                    pk=int(row['id']),
+                    text=row['text'],
+                    pub_date=date(row['pub_date']),
+                    updated=date(row['updated']),
+                    author_id=author_id,
+                    group_id=self.group_id(row['group']),
+                    image=self.image(row['image'] or ''),
+                ))
+            Post.objects.bulk_create(posts)
+            count += len(posts)
+        self.reset_sequences(Post)
+        return count
+
+    def image(self, name):
+        if not name or not self.media_dir:
+            return name
+        if default_storage.exists(name):
+            return name
+        with open(os.path.join(self.media_dir, name), 'rb') as source:
+            return default_storage.save(name, File(source))
+
+    def load_comments(self, rows):
+        if not self.user_ids:
+            self.user_ids = dict(User.objects.values_list('username', 'pk'))
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            Comment.objects.bulk_create(
+                Comment(
+                    pk=int(row['id']),
+                    post_id=int(row['post']),
+                    author_id=self.user_id(row['author']),
+                    text=row['text'],
+                    pub_date=date(row['pub_date']),
+                )
+                for row in batch
+            )
+            count += len(batch)
+        self.reset_sequences(Comment)
+        return count
+
+    def reset_sequences(self, *models):
+        """
+        Строки вставлены с id из выгрузки, поэтому счётчик id таблицы
+        (sequence в PostgreSQL) сдвигается за максимальный; иначе
+        следующий пост получил бы занятый id. SQLite берёт MAX(id) сам.
+        """
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def load_follows(self, rows):
+        if not self.user_ids:
+            self.user_ids = dict(User.objects.values_list('username', 'pk'))
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            follows = []
+            for row in batch:
+                user_id = self.user_id(row['user'])
+                author_id = self.user_id(row['author'])
+                if user_id != author_id:
+                    self.new_authors.add(author_id)
+                    follows.append(
+                        Follow(user_id=user_id, author_id=author_id)
+                    )
+            Follow.objects.bulk_create(follows, ignore_conflicts=True)
+            count += len(batch)
+        return count
+
+    def rebuild_timelines(self):
+        """
+        bulk_create не шлёт сигналов, поэтому ленты подписчиков
+        затронутых загрузкой авторов собираются здесь: на автора один
+        INSERT ... SELECT его последних постов во все ленты подписчиков
+        и один DELETE, обрезающий эти ленты. Возвращает число авторов.
+        """
+        # INSERT OR IGNORE в SQLite, ON CONFLICT DO NOTHING в PostgreSQL
+        insert = connection.ops.insert_statement(ignore_conflicts=True)
+        on_conflict = connection.ops.ignore_conflicts_suffix_sql(True)
+        timeline = Timeline._meta.db_table
+        with connection.cursor() as cursor:
+            for author_id in sorted(self.new_authors):
+                cursor.execute(
+                    f'{insert} {timeline} (user_id, post_id, pub_date)'
+                    f' SELECT follow.user_id, post.id, post.pub_date'
+                    f' FROM {Follow._meta.db_table} follow,'
+                    f' (SELECT id, pub_date FROM {Post._meta.db_table}'
+                    f' WHERE author_id = %s ORDER BY pub_date DESC LIMIT %s)'
+                    f' post WHERE follow.author_id = %s {on_conflict}',
+                    [author_id, settings.TIMELINE_LENGTH, author_id]
+                )
+                Timeline.trim_many(
+                    Follow.objects.filter(author_id=author_id).values(
+                        'user_id'
+                    )
+                )
+        return len(self.new_authors)
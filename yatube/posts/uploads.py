@@ -0,0 +1,131 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from PIL import Image
+
+from .models import Post
+
+# Сколько начальных байт файла читать в поисках размеров картинки
+HEADER_LIMIT = 256 * 1024
+# Длинная сторона картинки после пережатия
+COMPACT_SIDE = 1920
+
+
+class RejectedUpload(UploadedFile):
+    """Пустой файл на месте отклонённой загрузки; причина в rejection."""
+
+    def __init__(self, name, content_type, rejection):
+        super().__init__(BytesIO(), name, content_type, size=0)
+        self.rejection = rejection
+
+
+def image_size(header):
+    """Размеры картинки по заголовку файла или None, если данных мало."""
+    try:
+        with Image.open(BytesIO(header)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+class LimitedImageUploadHandler(FileUploadHandler):
+    """
+    Первый обработчик загрузок: ограничивает байты и размеры картинки.
+
+    Размеры читаются из заголовка файла, не декодируя картинку.
+    Как только лимит превышен, данные перестают передаваться
+    следующим обработчикам, то есть не копятся ни в памяти,
+    ни во временном файле.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.rejection = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejection:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            max_size = filesizeformat(settings.POST_IMAGE_MAX_BYTES)
+            return self.reject(f'Файл больше {max_size}.')
+        if self.header is not None:
+            self.header += raw_data
+            size = image_size(self.header)
+            if size is not None:
+                self.header = None
+                max_side = settings.POST_IMAGE_MAX_SIDE
+                if max(size) > max_side:
+                    return self.reject(
+                        f'Картинка больше {max_side}x{max_side} пикселей.'
+                    )
+            elif len(self.header) >= HEADER_LIMIT:
+                # Не картинка: её отклонит проверка ImageField
+                self.header = None
+        return raw_data
+
+    def reject(self, rejection):
+        self.rejection = rejection
+        self.header = None
+        return None
+
+    def file_complete(self, file_size):
+        if self.rejection:
+            return RejectedUpload(
+                self.file_name, self.content_type, self.rejection
+            )
+        return None
+
+
+def compact_image(name):
+    """
+    Пережимает загруженную картинку: уменьшает и сохраняет JPEG
+    прогрессивным, PNG - оптимизированным. Возвращает имя файла,
+    на которое теперь ссылается пост.
+
+    Пережатый файл пишется под новым именем, пост переключается
+    на него одним UPDATE, и только потом удаляется старый файл:
+    картинка поста не пропадает ни на миг.
+    Уже пережатые файлы не трогает, чтобы не терять качество.
+    """
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        if image.format not in ('JPEG', 'PNG'):
+            return name
+        if image.format == 'JPEG' and image.info.get('progressive'):
+            return name
+        if image.format == 'PNG' and max(image.size) <= COMPACT_SIDE:
+            return name
+        image.load()
+        original_size = source.size
+    image_format = image.format
+    image.thumbnail((COMPACT_SIDE, COMPACT_SIDE))
+    output = BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(
+            output, 'JPEG', quality=85, optimize=True, progressive=True
+        )
+    else:
+        image.save(output, 'PNG', optimize=True)
+    if output.tell() >= original_size:
+        return name
+    # Имя занято исходным файлом, поэтому хранилище выберет свободное
+    compacted = default_storage.save(name, ContentFile(output.getvalue()))
+    # updated меняется, чтобы кэш карточек и ETag увидели новый файл
+    switched = Post.objects.filter(image=name).update(
+        image=compacted, updated=timezone.now()
+    )
+    if not switched:
+        # Пост успели удалить или сменить ему картинку
+        default_storage.delete(compacted)
+        return name
+    default_storage.delete(name)
+    return compacted
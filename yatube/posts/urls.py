@@ -6,9 +6,18 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('popular/', views.popular, name='popular'),
+    path('group/', views.group_index, name='group_index'),
     path('group/<slug:group_slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('search/', views.search_page, name='search'),
+    path('search/api/', views.search_api, name='search_api'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -16,6 +25,7 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path('notifications/', views.notifications, name='notifications'),
     # Подписки на авторов
     path('follow/', views.follow_index, name='follow_index'),
     path(
@@ -1,67 +1,308 @@
-from django.views.decorators.cache import cache_page
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-# from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control
 
-from .models import Post, Group, Follow
+from core.executor import gather
+from core.paginator import CursorPage, CursorPaginator, KeysetPaginator
+from . import search
+from .caching import PAGE_TIMEOUT, page_key
+from .models import (
+    Comment, Post, Group, Follow, FollowSuggestion, Notification
+)
+from .thumbnails import find_thumbnail
 from .forms import PostForm, CommentForm
 
 
 User = get_user_model()
 
 POST_NUMBERS = 10
+COMMENT_NUMBERS = 20
+SUGGESTION_NUMBERS = 5
+NOTIFICATION_NUMBERS = 20
+GROUP_NUMBERS = 20
 
 
-def paginator_view(request, posts, number):
+def paginator_view(request, posts, number, field='pub_date'):
+    # ?page= - классическая пагинация, ?cursor= - keyset по (pub_date, id)
+    cursor_mode = (
+        'cursor' in request.GET
+        or settings.PAGINATION_MODE == 'cursor'
+    )
+    if cursor_mode and 'page' not in request.GET:
+        paginator = CursorPaginator(posts, number, field)
+        return paginator.get_page(request.GET.get('cursor'))
     paginator = Paginator(posts, number)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
-@cache_page(20, key_prefix="index_page")
+def fetched(page_obj):
+    """Страница с уже прочитанными постами: для чтения в gather."""
+    page_obj.object_list = list(page_obj.object_list)
+    return page_obj
+
+
+def cached_paginator_view(request, posts, number, feed):
+    """
+    paginator_view, который кэширует только id постов страницы.
+
+    Сами посты читаются по первичному ключу, поэтому карточки
+    и счётчики всегда свежие, а COUNT(*) и OFFSET не повторяются.
+    """
+    key = page_key(feed, request)
+    cached = cache.get(key)
+    if cached is None:
+        page_obj = paginator_view(request, posts, number)
+        if isinstance(page_obj, CursorPage):
+            state = {
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+            }
+        else:
+            state = {
+                'number': page_obj.number,
+                'count': page_obj.paginator.count,
+            }
+        cache.set(key, ([post.pk for post in page_obj], state), PAGE_TIMEOUT)
+        return page_obj
+    ids, state = cached
+    posts_by_id = posts.in_bulk(ids)
+    object_list = [posts_by_id[pk] for pk in ids if pk in posts_by_id]
+    if 'count' not in state:
+        return CursorPage(
+            object_list, CursorPaginator(posts, number),
+            state['has_next'], state['has_previous']
+        )
+    paginator = Paginator(posts, number)
+    paginator.count = state['count']
+    return Page(object_list, state['number'], paginator)
+
+
+def post_stamps(post):
+    """Всё, от чего зависит карточка поста."""
+    return (
+        post.pk, post.updated, post.comment_count,
+        post.author.username, post.author.get_full_name(),
+        post.group and post.group.slug, post.group and post.group.title,
+        # Пока превью не готово, вместо картинки заглушка
+        find_thumbnail(post.image, 'card') is not None,
+    )
+
+
+def page_stamps(page_obj):
+    if isinstance(page_obj, CursorPage):
+        navigation = (page_obj.has_next(), page_obj.has_previous())
+    else:
+        navigation = (page_obj.number, page_obj.paginator.count)
+    return [navigation, *map(post_stamps, page_obj)]
+
+
+def render_conditional(request, template, context, stamps):
+    """
+    render с условным GET: на совпавший If-None-Match - 304 без шаблона.
+
+    ETag считается по уже загруженным данным страницы (stamps),
+    пользователю и строке запроса, без лишних запросов к БД.
+    ETag слабый: токен CSRF в разметке меняется от показа к показу.
+    """
+    validator = repr([request.user.pk, request.get_full_path(), stamps])
+    etag = f'W/"{md5(validator.encode()).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, template, context)
+    response['ETag'] = etag
+    # Страница своя у каждого читателя и проверяется при каждом показе
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.all()
-    page_obj = paginator_view(request, posts, POST_NUMBERS)
+    posts = Post.objects.feed()
+    page_obj = cached_paginator_view(request, posts, POST_NUMBERS, 'index')
+    return render_conditional(
+        request, template, {'page_obj': page_obj}, page_stamps(page_obj)
+    )
+
+
+def popular(request):
+    template = 'posts/popular.html'
+    # Рейтинг обновляют задачи posts.tasks по событиям; страница -
+    # срез индекса по rank в таблице не длиннее HOT_POSTS, листается
+    # по ключу (rank, id) без OFFSET
+    ordering = ('-rank', '-pk')
+    posts = Post.objects.feed().filter(hot__isnull=False).annotate(
+        rank=F('hot__rank')
+    ).order_by(*ordering)
+    page_obj = KeysetPaginator(posts, POST_NUMBERS, ordering).get_page(
+        request.GET.get('cursor')
+    )
+    context = {
+        'page_obj': page_obj,
+        'popular': True,
+    }
+    return render(request, template, context)
+
+
+def group_index(request):
+    template = 'posts/groups.html'
+    # Сводки посчитаны заранее (GroupStats): страница - один запрос
+    # по индексу (-post_count, title) без COUNT, OFFSET и GROUP BY
+    ordering = ('-post_count', 'title', 'pk')
+    groups = Group.objects.select_related('stats').order_by(*ordering)
+    page_obj = KeysetPaginator(groups, GROUP_NUMBERS, ordering).get_page(
+        request.GET.get('cursor')
+    )
     return render(request, template, {'page_obj': page_obj})
 
 
 def group_posts(request, group_slug):
-    group = get_object_or_404(Group, slug=group_slug)
     template = 'posts/group_list.html'
-    posts = group.posts.all()
-    page_obj = paginator_view(request, posts, POST_NUMBERS)
+    posts = Post.objects.feed().filter(group__slug=group_slug)
+    group, page_obj = gather(
+        lambda: get_object_or_404(
+            Group.objects.select_related('stats'), slug=group_slug
+        ),
+        lambda: fetched(paginator_view(request, posts, POST_NUMBERS)),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
     }
-    return render(request, template, context)
+    stats = getattr(group, 'stats', None)
+    stamps = [
+        group.title, group.description, group.post_count,
+        stats and stats.top_authors, stats and stats.last_post_date,
+    ]
+    return render_conditional(
+        request, template, context, stamps + page_stamps(page_obj)
+    )
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = paginator_view(request, posts, POST_NUMBERS)
+    user = request.user
+    posts = Post.objects.feed().filter(author__username=username)
+    author, page_obj, following = gather(
+        lambda: get_object_or_404(
+            User.objects.select_related('stats'), username=username
+        ),
+        lambda: fetched(paginator_view(request, posts, POST_NUMBERS)),
+        lambda: user.is_authenticated and Follow.objects.filter(
+            user=user, author__username=username
+        ).exists(),
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
+        'following': following,
     }
-    return render(request, 'posts/profile.html', context)
+    stats = getattr(author, 'stats', None)
+    stamps = [author.get_full_name(), stats and stats.post_count, following]
+    return render_conditional(
+        request, 'posts/profile.html', context,
+        stamps + page_stamps(page_obj)
+    )
+
+
+def comments_page(request, post_id):
+    """
+    Порция комментариев к посту по курсору.
+
+    ?order=old - от старых к новым, по умолчанию сначала новые.
+    """
+    order = 'old' if request.GET.get('order') == 'old' else 'new'
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only('text', 'pub_date', 'post_id', 'author__username')
+    paginator = CursorPaginator(
+        comments, COMMENT_NUMBERS, descending=order == 'new'
+    )
+    return paginator.get_page(request.GET.get('cursor')), order
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.select_related("author", "post").all()
+    post, (comments, order) = gather(
+        lambda: get_object_or_404(
+            Post.objects.select_related('author__stats', 'group'), pk=post_id
+        ),
+        lambda: comments_page(request, post_id),
+    )
     form = CommentForm()
     context = {
         'post': post,
         'comments': comments,
+        'comment_order': order,
         'form': form,
     }
-    return render(request, 'posts/post_detail.html', context)
+    stats = getattr(post.author, 'stats', None)
+    stamps = [
+        post_stamps(post), stats and stats.post_count,
+        comments.has_next(), comments.has_previous(),
+        [(comment.pk, comment.author.username) for comment in comments],
+    ]
+    return render_conditional(
+        request, 'posts/post_detail.html', context, stamps
+    )
+
+
+def post_comments(request, post_id):
+    """Фрагмент со следующей порцией комментариев для подгрузки."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, order = comments_page(request, post.pk)
+    context = {
+        'post': post,
+        'comments': comments,
+        'comment_order': order,
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+def search_page(request):
+    """Страница результатов поиска по постам, от самых релевантных."""
+    query = request.GET.get('q', '').strip()
+    posts = search.search(query)
+    # Поиск упорядочен по рангу, а не по дате, поэтому без курсора
+    page_obj = Paginator(posts, POST_NUMBERS).get_page(
+        request.GET.get('page')
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def search_api(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = Paginator(search.search(query), POST_NUMBERS).get_page(
+        request.GET.get('page')
+    )
+    return JsonResponse({
+        'query': query,
+        'page': page_obj.number,
+        'num_pages': page_obj.paginator.num_pages,
+        'results': [
+            {
+                'id': post.pk,
+                'text': post.text,
+                'author': post.author.username,
+                'group': post.group.slug if post.group else None,
+                'pub_date': post.pub_date,
+            }
+            for post in page_obj
+        ],
+    })
 
 
 @login_required()
@@ -115,14 +356,44 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@login_required
+def notifications(request):
+    # Уведомления создаются задачами notify_followers и notify_comment
+    template = 'posts/notifications.html'
+    items = request.user.notifications.select_related(
+        'actor', 'post'
+    ).order_by('-created', '-pk')
+    page_obj = Paginator(items, NOTIFICATION_NUMBERS).get_page(
+        request.GET.get('page')
+    )
+    # Показанные отмечаются прочитанными, но на этой странице
+    # ещё выделены как новые
+    unread = [item.pk for item in page_obj if not item.read]
+    if unread:
+        Notification.objects.filter(pk__in=unread).update(read=True)
+    return render(request, template, {'page_obj': page_obj})
+
+
 # Подписки на авторов
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
     user = request.user
-    posts = Post.objects.filter(author__following__user=user)
-    page_obj = paginator_view(request, posts, POST_NUMBERS)
-    context = {'page_obj': page_obj}
+    # Сортировка по копии даты в ленте: страница читается
+    # по индексу (user, -pub_date) без сортировки всей ленты
+    posts = Post.objects.feed().filter(
+        timeline_entries__user=user
+    ).annotate(
+        timeline_date=F('timeline_entries__pub_date')
+    ).order_by('-timeline_date')
+    page_obj = paginator_view(
+        request, posts, POST_NUMBERS, field='timeline_date'
+    )
+    context = {
+        'page_obj': page_obj,
+        # Посчитаны заранее командой suggest_follows
+        'suggestions': FollowSuggestion.for_user(user, SUGGESTION_NUMBERS),
+    }
     return render(request, template, context)
 
 
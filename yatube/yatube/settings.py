@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -51,11 +52,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -85,6 +88,20 @@ TEMPLATES = [
     },
 ]
 
+# Компилировать шаблоны один раз на процесс (cached.Loader).
+# Без DEBUG Django включает его сам; True включает и при DEBUG
+# (правки шаблонов тогда видны только после перезапуска, а
+# debug_toolbar предупреждает W006 из-за APP_DIRS=False)
+TEMPLATE_CACHE = False
+if TEMPLATE_CACHE:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -98,6 +115,54 @@ DATABASES = {
     }
 }
 
+# Локальные реплики для чтения лент: файлы replica1.sqlite3, ...
+# с копией db.sqlite3, которую обновляет manage.py sync_replicas.
+# 0 - всё читается из default
+SQLITE_REPLICAS = 0
+for number in range(1, SQLITE_REPLICAS + 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'replica{number}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Алиасы DATABASES, с которых читают представления из REPLICA_VIEWS
+# (core.middleware.ReplicaMiddleware); пишет всё только default
+DATABASE_REPLICAS = [f'replica{n}' for n in range(1, SQLITE_REPLICAS + 1)]
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+    'posts:popular',
+]
+# Сколько секунд после своей записи браузер читает с default,
+# чтобы не увидеть устаревшую реплику
+REPLICA_PIN_SECONDS = 10
+
+# Продакшен-режим SQLite: WAL (читатели не ждут писателя),
+# synchronous=NORMAL, mmap и кэш страниц побольше, ожидание
+# блокировки вместо "database is locked" и постоянные соединения.
+# Без DEBUG включён; True включает и при DEBUG
+SQLITE_TUNING = not DEBUG
+# Выполняются на каждом новом соединении (core.db.configure_sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ: 64 МиБ на соединение
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Сколько секунд ждать снятия блокировки записи
+SQLITE_BUSY_TIMEOUT = 20
+if SQLITE_TUNING:
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+        database['OPTIONS'] = {'timeout': SQLITE_BUSY_TIMEOUT}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -141,6 +206,15 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Картинки постов проверяются при загрузке, до буферизации файла целиком
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+POST_IMAGE_MAX_SIDE = 6000
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT = 'posts:index'
 
@@ -153,9 +227,79 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE = 'core.views.csrf_failure'
 
+# Режим пагинации лент: 'cursor' (keyset по pub_date, id) или 'offset'
+PAGINATION_MODE = 'offset'
 
-CACHES = {
-    'default': {
+# Сколько последних постов хранится в ленте подписок пользователя
+TIMELINE_LENGTH = 1000
+
+# Сколько рекомендаций авторов хранит на пользователя suggest_follows
+FOLLOW_SUGGESTIONS = 20
+
+# Лента "Популярное": за сколько секунд вес события падает вдвое
+# и сколько постов с лучшим рейтингом хранится в posts.HotPost
+HOT_HALF_LIFE = 12 * 60 * 60
+HOT_POSTS = 1000
+
+# Сколько самых активных авторов группы хранит refresh_group_stats
+GROUP_TOP_AUTHORS = 3
+
+# Адрес сайта для ссылок в письмах: в команде send_digests нет запроса
+SITE_URL = 'http://127.0.0.1:8000'
+# Сколько уведомлений перечислять в одном письме-дайджесте
+DIGEST_ITEMS = 20
+
+# Поиск по постам: 'auto' - FTS5, если SQLite его поддерживает,
+# иначе инвертированный индекс PostTerm; либо явно 'fts5' / 'python'
+SEARCH_BACKEND = 'auto'
+
+# Потоки, создающие превью картинок постов; 0 - создавать сразу,
+# как при разработке, чтобы файлы появлялись предсказуемо
+THUMBNAIL_WORKERS = 0 if DEBUG else 2
+
+# Очередь задач core.tasks: False - задачи ставятся в таблицу
+# и выполняются воркерами manage.py run_tasks; True - сразу
+# в вызвавшем их процессе, как при разработке и в тестах
+TASKS_EAGER = DEBUG
+
+# Потоки для независимых чтений страницы (core.executor.gather):
+# пост и комментарии, автор и его посты читаются одновременно.
+# Выигрыш - у воркеров с одним запросом на процесс; при многих
+# потоках в процессе всё упирается в GIL (manage.py bench_concurrency).
+# 0 - по очереди в потоке запроса, как при разработке
+DB_EXECUTOR_WORKERS = 0 if DEBUG else 4
+
+
+# 'locmem' - свой кэш в каждом процессе,
+# 'sqlite' - общий файл для всех воркеров на машине
+CACHE_MODE = 'locmem'
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
+
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_MODE],
+}
+
+# Сколько секунд API помнит проверенный пароль Basic-авторизации,
+# чтобы не считать PBKDF2 на каждый запрос; 0 - проверять всегда
+API_AUTH_CACHE_SECONDS = 60
+
+# Гистограммы времени ответа, запросов к БД и рендера по имени URL
+# (core.middleware.MetricsMiddleware), отдаются на /metrics
+METRICS_ENABLED = True
+# С каких адресов можно читать /metrics
+METRICS_IPS = ['127.0.0.1']
+# Ответы дольше стольких секунд пишутся в лог core.metrics вместе с SQL;
+# None - не писать
+SLOW_REQUEST_SECONDS = 1.0